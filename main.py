@@ -11,6 +11,9 @@ from PySide6.QtGui import QIcon, QImage, QPixmap, QColor, QBrush
 from modules import *
 from modules.logger import Logger
 from modules.worker import Worker
+from modules.task_table import TaskTable
+from modules.result_writer import result_writer
+from modules.frame_pool import PooledFrame
 
 # Set DPI for High DPI displays
 os.environ["QT_FONT_DPI"] = "96"
@@ -52,6 +55,7 @@ class MainWindow(QMainWindow):
         self.worker.image_process.connect(lambda x: self.show_image(x, self.ui.image_view))
         self.worker.update_status.connect(lambda x: self.show_status(x))
         self.worker.inference_result.connect(lambda x, y: self.show_inference_result(x, y))
+        self.worker.task_changed.connect(self.show_task)
 
         self.worker_thread.start()  # Start the worker thread
 
@@ -78,6 +82,13 @@ class MainWindow(QMainWindow):
         for button, action in button_actions.items():
             button.clicked.connect(action)
 
+        # 任务(产品型号)选择, 换型在两次检测之间生效
+        self.task_combo = QComboBox(self.ui.homeToolBar)
+        self.task_combo.setMinimumSize(QSize(200, 40))
+        self.task_combo.addItems(TaskTable.read_task_names("config/setting.json"))
+        self.task_combo.currentTextChanged.connect(lambda x: self.worker.request_task(x))
+        self.ui.horizontalLayout_7.insertWidget(0, self.task_combo)
+
         # Set original page
         self.ui.stackedWidget.setCurrentWidget(self.ui.home)
         self.ui.btn_home.setStyleSheet(UIFunctions.selectMenu(self.ui.btn_home.styleSheet()))
@@ -143,6 +154,12 @@ class MainWindow(QMainWindow):
             button.setEnabled(True)
         self.ui.btn_stop.setEnabled(True)
 
+    def show_task(self, task_name):
+        """Show the active task selected by the worker (e.g. by PLC recipe bits)."""
+        self.task_combo.blockSignals(True)
+        self.task_combo.setCurrentText(task_name)
+        self.task_combo.blockSignals(False)
+
     def handle_error(self, message):
         """Handle errors from the worker."""
         # QMessageBox.critical(self, "Error", message)
@@ -150,6 +167,9 @@ class MainWindow(QMainWindow):
 
     def show_image(self, img_src, label):
         """Display image in a QLabel."""
+        pooled = img_src if isinstance(img_src, PooledFrame) else None
+        if pooled is not None:
+            img_src = pooled.array
         if img_src is not None:
             try:
                 ih, iw, _ = img_src.shape
@@ -170,6 +190,8 @@ class MainWindow(QMainWindow):
                 Logger.log_message(f"Error displaying image: {e}")
         else:
             label.clear()
+        if pooled is not None:
+            pooled.release()  # 已缩放显示, 归还图片缓冲区
 
     def show_status(self, msg):
         """Show status message in a label."""
@@ -200,7 +222,7 @@ class MainWindow(QMainWindow):
             self.ui.table_result.setItem(index, 0, QTableWidgetItem(target["label"]))
             self.ui.table_result.setItem(index, 1, QTableWidgetItem(str(target["target_conf"])))
             self.ui.table_result.setItem(index, 2, QTableWidgetItem(str(target["predict_conf"])))
-            result = RESULT_OK if target["predict_conf"] >= target["target_conf"] else RESULT_NG
+            result = RESULT_OK if target["passed"] else RESULT_NG
             self.ui.table_result.setItem(index, 3, QTableWidgetItem(result))
 
             if result == RESULT_OK:
@@ -222,6 +244,8 @@ class MainWindow(QMainWindow):
         self.stop()
         self.worker_thread.quit()
         self.worker_thread.wait()
+        result_writer.close()  # 写完队列中的结果图片
+        self.worker.cameras.close()
         event.accept()
         Logger.log_message("Application closed.")
 
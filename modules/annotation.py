@@ -0,0 +1,114 @@
+"""检测结果标注.
+
+storage=sidecar 时每次检测只保存相机原始JPEG及同名 .json 标注文件(检测框、置信度、判定结果),
+不再缩放及重新编码标注图片; 需要查看时用本工具按标注文件生成标注图片.
+
+用法: python -m modules.annotation D:/images/result/3UG-64530-3AO/2025-01-01 --out D:/images/annotated
+"""
+import argparse
+import glob
+import json
+import os
+import cv2
+import numpy as np
+from modules.logger import Logger
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def draw_predictions(img, predictions, scale=(1.0, 1.0)):
+    """在图片上画出各目标的检测框、标签及置信度; scale 为检测框坐标到图片坐标的缩放比例 (x, y)."""
+    sx, sy = scale
+    for prediction in predictions:
+        box = (np.asarray(prediction["boxes"], dtype=np.float64) * (sx, sy, sx, sy)).astype(int)
+        label = f"{prediction["label"]} {prediction["predict_conf"]:.2f}"
+        color = tuple(int(c) for c in prediction["color"])
+        cv2.rectangle(img, (box[0], box[1]), (box[2], box[3]), color, 2)
+        cv2.putText(img, label, (box[0], box[1] - 10), FONT, 0.5, color, 2)
+    return img
+
+
+class AnnotationRenderer:
+    """在缩放到输出分辨率的副本上画检测结果, 不修改输入图片."""
+
+    def __init__(self, size=(1280, 720)):
+        self.size = size
+
+    def render(self, img, predictions, frame_shape=None):
+        """返回缩放到输出分辨率并画好检测结果的新图片; img 为缩小的预览图时 frame_shape 为原图尺寸."""
+        frame_shape = img.shape if frame_shape is None else frame_shape
+        scale = (self.size[0] / frame_shape[1], self.size[1] / frame_shape[0])
+        return draw_predictions(cv2.resize(img, self.size), predictions, scale)
+
+
+def encode_sidecar(image_name, task_name, timestamp, predictions, result_ready):
+    """生成标注文件内容(JSON), 坐标为原图坐标."""
+    sidecar = {
+        "image": image_name,
+        "task_name": task_name,
+        "timestamp": timestamp,
+        "result": "OK" if result_ready else "NG",
+        "predictions": [{
+            "label": prediction["label"],
+            "predict_conf": float(prediction["predict_conf"]),
+            "target_conf": float(prediction["target_conf"]),
+            "boxes": [float(v) for v in prediction["boxes"]],
+            "color": [int(c) for c in prediction["color"]],
+        } for prediction in predictions],
+    }
+    return json.dumps(sidecar, ensure_ascii=False).encode("utf-8")
+
+
+# 创建全局标注绘制实例
+annotation_renderer = AnnotationRenderer()
+
+
+def load_sidecar(sidecar_path):
+    with open(sidecar_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def render_sidecar(sidecar_path, size=None):
+    """读取标注文件及对应的原始图片, 返回标注图片; size 不为空时缩放到该尺寸."""
+    sidecar = load_sidecar(sidecar_path)
+    image_path = os.path.join(os.path.dirname(sidecar_path), sidecar["image"])
+    img = cv2.imread(image_path)
+    if img is None:
+        raise FileNotFoundError(f"图片读取失败: {image_path}")
+
+    draw_predictions(img, sidecar["predictions"])
+    if size is not None:
+        img = cv2.resize(img, size)
+    return img
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按标注文件生成检测结果标注图片")
+    parser.add_argument("path", help="标注文件(.json)或其所在目录")
+    parser.add_argument("--out", default=None, help="输出目录, 默认与标注文件相同")
+    parser.add_argument("--width", type=int, default=0, help="输出宽度, 0 表示保持原图分辨率")
+    parser.add_argument("--height", type=int, default=0, help="输出高度")
+    args = parser.parse_args()
+
+    Logger.setup_logging()
+    if os.path.isdir(args.path):
+        sidecar_paths = sorted(glob.glob(os.path.join(args.path, "*.json")))
+    else:
+        sidecar_paths = [args.path]
+    size = (args.width, args.height) if args.width and args.height else None
+
+    for sidecar_path in sidecar_paths:
+        out_dir = args.out or os.path.dirname(sidecar_path)
+        os.makedirs(out_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(sidecar_path))[0]
+        out_path = os.path.join(out_dir, f"{stem}_annotated.jpg")
+        try:
+            cv2.imwrite(out_path, render_sidecar(sidecar_path, size))
+        except Exception as e:
+            Logger.log_error(f"标注图片生成失败 {sidecar_path}: {str(e)}")
+            continue
+        Logger.log_info(f"标注图片: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import asyncio
+import math
+import threading
+import time
+import numpy as np
+from modules.logger import Logger
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图(1ms ~ 60s, 每10倍20个桶), 用于估计分位数, 内存固定不随样本数增长."""
+
+    def __init__(self, low=0.001, high=60.0, buckets_per_decade=20):
+        count = int(math.ceil(math.log10(high / low) * buckets_per_decade))
+        self.edges = np.logspace(math.log10(low), math.log10(high), count + 1)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64)  # 末尾为超过 high 的样本
+        self.count = 0
+
+    def record(self, seconds):
+        self.counts[np.searchsorted(self.edges, seconds)] += 1
+        self.count += 1
+
+    def percentile(self, p):
+        """第 p 百分位延迟(秒, 取所在桶的上界), 无样本时返回 None."""
+        if not self.count:
+            return None
+        index = int(np.searchsorted(np.cumsum(self.counts), self.count * p / 100))
+        return float(self.edges[min(index, len(self.edges) - 1)])
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, **{f"p{p}_ms": round(self.percentile(p) * 1000, 1) for p in (50, 95, 99)}}
+
+
+class EventLoopThread:
+    """专用的 asyncio 事件循环线程, 首次使用时启动; 其他线程通过 run 提交协程并等待结果."""
+
+    def __init__(self):
+        self.loop = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="CameraLoop", daemon=True).start()
+
+    def run(self, coro):
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+# 创建全局相机事件循环实例
+camera_loop = EventLoopThread()
+
+
+class AsyncCameraClient:
+    """异步抓图客户端(httpx AsyncClient + 摘要认证), 每次抓图有截止时间.
+
+    第一次请求在首字节延迟的 hedge_percentile 分位数内未收到响应头时, 同时发出第二个请求, 先返回者为准;
+    请求失败时在截止时间内重试, 最多 max_attempts 个请求.
+    """
+
+    def __init__(self, url, username, password, name="", hedge_percentile=95, hedge_min_samples=20, max_attempts=3):
+        import httpx  # 可选依赖, 仅 client=async 时需要
+
+        self.url = url
+        self.name = name
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.max_attempts = max_attempts
+        self.client = httpx.AsyncClient(auth=httpx.DigestAuth(username, password),
+                                        limits=httpx.Limits(max_connections=max_attempts,
+                                                            max_keepalive_connections=2))
+        self.first_byte = LatencyHistogram()  # 发出请求到收到响应头
+        self.total = LatencyHistogram()  # 发出请求到收完图片数据
+        self.hedges = 0
+        self.failures = 0  # 失败的请求数
+        self.exhausted = 0  # 截止时间之前全部请求均已失败的抓图次数
+        self.timeouts = 0  # 超过截止时间的抓图次数
+
+    def hedge_delay(self):
+        """发出对冲请求前的等待时间, 样本不足时不对冲."""
+        if self.first_byte.count < self.hedge_min_samples:
+            return None
+        return self.first_byte.percentile(self.hedge_percentile)
+
+    async def _attempt(self, headers_received):
+        start_time = time.perf_counter()
+        async with self.client.stream("GET", self.url) as response:
+            headers_received.set()
+            self.first_byte.record(time.perf_counter() - start_time)
+            if response.status_code != 200:
+                raise RuntimeError(f"状态码: {response.status_code}")
+            content = await response.aread()
+        self.total.record(time.perf_counter() - start_time)
+        return content
+
+    async def _fetch(self, deadline):
+        loop = asyncio.get_running_loop()
+        end_time = loop.time() + deadline
+        headers_received = asyncio.Event()
+        pending = {asyncio.create_task(self._attempt(headers_received))}
+        attempts = 1
+
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                waiter = asyncio.create_task(headers_received.wait())
+                await asyncio.wait(pending | {waiter}, timeout=min(delay, deadline),
+                                   return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if not headers_received.is_set() and not any(task.done() for task in pending):
+                    self.hedges += 1
+                    pending.add(asyncio.create_task(self._attempt(asyncio.Event())))
+                    attempts += 1
+
+            while pending:
+                remaining = end_time - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    self.failures += 1
+                    Logger.log_error(f"相机{self.name}抓图失败: {task.exception()!r}")
+                if not pending and attempts < self.max_attempts and end_time > loop.time():
+                    pending.add(asyncio.create_task(self._attempt(asyncio.Event())))  # 截止时间内重试
+                    attempts += 1
+
+            if not pending:
+                self.exhausted += 1
+                Logger.log_error(f"相机{self.name}抓图失败: {attempts} 个请求均失败")
+                return None
+            self.timeouts += 1
+            Logger.log_error(f"相机{self.name}抓图超过截止时间 {deadline:.2f}s")
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get(self, deadline):
+        """在截止时间(秒)内获取一张JPEG, 超时或全部请求失败时返回 None; 可在任意线程调用."""
+        return camera_loop.run(self._fetch(deadline))
+
+    def stats(self):
+        return {"first_byte": self.first_byte.summary(), "total": self.total.summary(),
+                "hedges": self.hedges, "failures": self.failures, "exhausted": self.exhausted,
+                "timeouts": self.timeouts}
+
+    def close(self):
+        camera_loop.run(self.client.aclose())
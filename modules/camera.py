@@ -1,47 +1,309 @@
-import cv2
 import requests
-import numpy as np
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPDigestAuth
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 from modules.logger import Logger
 from modules.config import global_config
+from modules.async_camera import AsyncCameraClient
+from modules.result_writer import result_writer  # 引用全局结果写入
+from modules.jpeg_decoder import JpegDecoder
+from modules.stream_grabber import StreamGrabber
+
+
+class CountingAdapter(HTTPAdapter):
+    """统计实际建立TCP连接次数及耗时的连接适配器; 长连接断开后在同一连接对象上重连也计入."""
+
+    def __init__(self, *args, **kwargs):
+        self.connections = 0
+        self.connect_time = 0.0
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        def timed(connection_cls):
+            class TimedConnection(connection_cls):
+                def connect(self):
+                    start_time = time.perf_counter()
+                    super().connect()
+                    adapter.connections += 1
+                    adapter.connect_time += time.perf_counter() - start_time
+            return TimedConnection
+
+        class TimedPool(HTTPConnectionPool):
+            ConnectionCls = timed(HTTPConnection)
+
+        class TimedHTTPSPool(HTTPSConnectionPool):
+            ConnectionCls = timed(HTTPSConnection)
+
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedPool, "https": TimedHTTPSPool}
 
 
 class Camera:
-    def __init__(self):
+    def __init__(self, section='Camera'):
         # 从全局配置中读取 Camera 设置
-        camera_settings = global_config.config['Camera']
+        camera_settings = global_config.get_camera_settings(section)
 
         # 初始化 Camera 属性
-        self.url = camera_settings.get('url', '')
-        self.username = camera_settings.get('username', '')
-        self.password = camera_settings.get('password', '')
-        self.photo_dir = camera_settings.get('photo_dir', '')
-        self.saveRequire = camera_settings.getboolean('saveRequire', fallback=False)
+        self.name = section.partition('.')[2]  # [Camera.名称] 中的名称, 单相机时为空
+        self.url = camera_settings['url']
+        self.username = camera_settings['username']
+        self.password = camera_settings['password']
+        self.photo_dir = camera_settings['photo_dir']
+        self.saveRequire = camera_settings['saveRequire']
+        self.last_jpeg = None  # 最近一次拍照的原始JPEG数据, storage=sidecar 时原样保存
+
+        # 多相机时每台相机检测的任务(为空时跟随当前任务); 目标按 setting.json 中各目标的 "camera" 分配给相机
+        self.task = camera_settings['task']
+
+        # roi_decode: 自动检测时只解码目标区域, 界面按 1/preview_scale 缩小解码显示
+        self.roi_decode = camera_settings['roi_decode']
+        self.preview_scale = camera_settings['preview_scale']
+        self.decoder = JpegDecoder()
+
+        # snapshot: 每次触发请求相机抓图; stream: 后台持续解码RTSP视频流, 触发时取最新一帧
+        self.mode = camera_settings['mode']
+        self.after_trigger = camera_settings['after_trigger']
+        self.max_frame_age = camera_settings['max_frame_age']
+        self.session = None
+        self.adapter = None
+        self.grabber = None
+        self.async_client = None
+
+        # client=async: 异步客户端, 每次抓图的截止时间为 takt_time * deadline_ratio(未配置节拍时 5s)
+        takt_time = global_config.get_plc_settings()['takt_time']
+        self.deadline = takt_time * camera_settings['deadline_ratio'] if takt_time > 0 else 5.0
+        if self.mode == "stream":
+            self.grabber = StreamGrabber(camera_settings['rtsp_url'], camera_settings['buffer_size'],
+                                         holders=camera_settings['pool_size'])
+            self.grabber.start()
+        elif camera_settings['client'] == "async":
+            self.async_client = AsyncCameraClient(self.url, self.username, self.password, self.name,
+                                                  camera_settings['hedge_percentile'],
+                                                  camera_settings['hedge_min_samples'],
+                                                  camera_settings['max_attempts'])
+        else:
+            self.open_session()
+
+    def open_session(self):
+        """建立长连接会话; 摘要认证对象随会话保留, 后续请求复用 nonce, 无需每次先收到 401 质询."""
+        if self.session is not None:
+            self.session.close()
+        self.session = requests.Session()
+        self.session.auth = HTTPDigestAuth(self.username, self.password)
+        self.adapter = CountingAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.grabber = None
+        if self.async_client is not None:
+            self.async_client.close()
+            self.async_client = None
+
+    def request_jpeg(self):
+        """请求一张JPEG, 返回 (响应, 各阶段耗时); 分开统计 建立连接、首字节 及 接收图片数据 的耗时."""
+        connections, connect_time = self.adapter.connections, self.adapter.connect_time
+        start_time = time.perf_counter()
+        response = self.session.get(self.url, timeout=5, stream=True)  # 收到响应头即返回
+        header_time = time.perf_counter()
+        content = response.content
+        body_time = time.perf_counter()
+        connect = self.adapter.connect_time - connect_time
+        timing = {
+            "new_connection": self.adapter.connections > connections,
+            "challenge": bool(response.history),  # nonce 过期时会多一次 401 往返
+            "connect": connect,
+            "first_byte": header_time - start_time - connect,
+            "body": body_time - header_time,
+            "size": len(content),
+        }
+        return response, timing
+
+    def file_stem(self, timestamp):
+        """保存图片的文件名, 多相机时加相机名称以免同一时刻的图片重名."""
+        return f"{timestamp}_{self.name}" if self.name else timestamp
 
     def get_frame(self):
+        """拍照, 返回 (frame, timestamp); frame 为图片缓冲池中的 PooledFrame, 图片为 frame.array, 用完后 release."""
+        if self.mode == "stream":
+            return self.get_stream_frame()
+        return self.get_snapshot()
+
+    def get_stream_frame(self):
+        """从视频流缓冲区取图: 默认取最新一帧, after_trigger 时等待触发之后解码的第一帧."""
+        trigger_time = time.time()
+        if self.after_trigger:
+            frame, frame_time = self.grabber.frame_after(trigger_time)
+        else:
+            frame, frame_time = self.grabber.latest()
+        if frame is None:
+            Logger.log_error("拍照失败, 视频流没有图片")
+            return None, None
+
+        now = time.time()
+        age = now - frame_time  # 取到图片时该帧已解码完成多久
+        if age > self.max_frame_age:
+            frame.release()
+            Logger.log_error(f"拍照失败, 视频流图片已过期 {age:.1f}s")
+            return None, None
+        Logger.log_info(f"取流图片: 帧龄 {age * 1000:.0f}ms, 等待 {(now - trigger_time) * 1000:.0f}ms, "
+                        f"断流重连 {self.grabber.reconnects} 次")
+
+        timestamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(frame_time))
+        self.last_jpeg = None  # 视频流图片没有相机JPEG, 需要保存时由 save_frame 在后台编码
+        return frame, timestamp
+
+    def save_frame(self, frame, timestamp):
+        """视频流模式需要保存照片时, 将图片交给后台写入线程编码保存; 在输出判定结果之后调用."""
+        if self.mode != "stream" or not self.saveRequire:
+            return
+        # 文件夹格式yyyy-mm-dd, 如2025-01-01
+        save_path = os.path.join(str(self.photo_dir), time.strftime('%Y-%m-%d'), f"{self.file_stem(timestamp)}.jpg")
+        result_writer.submit(save_path, frame.array, frame=frame.retain())
+
+    def get_snapshot(self):
+        jpeg, timestamp = self.get_jpeg()
+        if jpeg is None:
+            return None, None
+
+        decode_start = time.time()
         try:
-            response = requests.get(self.url, auth=requests.auth.HTTPDigestAuth(self.username, self.password),
-                                    timeout=5)
-            if response.status_code == 200:
-                result = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
-                if result is None:
-                    Logger.log_error("图片解码异常")
-                    return None, None
-
-                timestamp = time.strftime('%Y%m%d_%H%M%S')
-                if self.saveRequire:
-                    # 文件夹格式yyyy-mm-dd, 如2025-01-01
-                    root_dir = os.path.join(str(self.photo_dir), time.strftime('%Y-%m-%d'))
-                    os.makedirs(root_dir, exist_ok=True)  # Ensure results directory exists
-
-                    save_path = os.path.join(root_dir, f"{timestamp}.jpg")
-                    with open(save_path, 'wb') as file:
-                        file.write(response.content)
-                return result, timestamp
-            else:
-                Logger.log_error(f"拍照失败, 状态码: {response.status_code}")
+            frame = self.decoder.decode(jpeg)
+        except Exception as e:
+            Logger.log_error(f"图片解码异常: {str(e)}")
+            return None, None
+        if frame is None:
+            Logger.log_error("图片解码异常")
+            return None, None
+        Logger.log_info(f"解码耗时: {(time.time() - decode_start) * 1000:.0f}ms")
+        return frame, timestamp
+
+    def get_views(self, roi=None, preview_scale=2):
+        """拍照并返回 (views, timestamp): 检测只解码 roi 范围, 界面显示用缩小解码的预览图, 见 JpegDecoder.decode_views;
+        用完后释放 views["frames"] 中的缓冲区."""
+        if self.mode == "stream":
+            frame, timestamp = self.get_stream_frame()
+            if frame is None:
+                return None, None
+            views = self.decoder.views_from_frame(frame, roi, preview_scale)
+            frame.release()  # views 已持有该缓冲区
+            return views, timestamp
+
+        jpeg, timestamp = self.get_jpeg()
+        if jpeg is None:
+            return None, None
+
+        decode_start = time.time()
+        try:
+            views = self.decoder.decode_views(jpeg, roi, preview_scale)
+        except Exception as e:
+            Logger.log_error(f"图片解码异常: {str(e)}")
+            return None, None
+        if views is None:
+            Logger.log_error("图片解码异常")
+            return None, None
+        Logger.log_info(f"解码耗时: {(time.time() - decode_start) * 1000:.0f}ms, "
+                        f"区域 {views['roi'].shape[1]}x{views['roi'].shape[0]}, "
+                        f"预览 {views['preview'].shape[1]}x{views['preview'].shape[0]}")
+        return views, timestamp
+
+    def get_jpeg(self):
+        """请求相机抓图, 返回 (原始JPEG数据, timestamp), 失败返回 (None, None)."""
+        try:
+            content = self.fetch_async() if self.async_client is not None else self.fetch_jpeg()
+            if content is None:
                 return None, None
+
+            timestamp = time.strftime('%Y%m%d_%H%M%S')
+            self.last_jpeg = content
+            if self.saveRequire:
+                # 文件夹格式yyyy-mm-dd, 如2025-01-01
+                root_dir = os.path.join(str(self.photo_dir), time.strftime('%Y-%m-%d'))
+                os.makedirs(root_dir, exist_ok=True)  # Ensure results directory exists
+
+                save_path = os.path.join(root_dir, f"{self.file_stem(timestamp)}.jpg")
+                with open(save_path, 'wb') as file:
+                    file.write(content)
+            return content, timestamp
         except Exception as e:
             Logger.log_error(f"拍照失败：{str(e)}")
             return None, None
+
+    def fetch_jpeg(self):
+        """用长连接会话抓图, 返回JPEG数据, 失败返回 None."""
+        if self.session is None:
+            self.open_session()
+        try:
+            response, timing = self.request_jpeg()
+        except requests.exceptions.ConnectionError as e:
+            # 相机重启或长连接被关闭时重建会话并重试一次
+            Logger.log_error(f"相机连接断开, 重新连接: {str(e)}")
+            self.open_session()
+            response, timing = self.request_jpeg()
+
+        if response.status_code != 200:
+            Logger.log_error(f"拍照失败, 状态码: {response.status_code}")
+            return None
+        Logger.log_info(f"拍照耗时: {'新建连接' if timing['new_connection'] else '复用连接'}"
+                        f"{', 认证质询' if timing['challenge'] else ''}, "
+                        f"连接 {timing['connect'] * 1000:.0f}ms, 首字节 {timing['first_byte'] * 1000:.0f}ms, "
+                        f"接收 {timing['size'] / 1024:.0f}KB {timing['body'] * 1000:.0f}ms")
+        return response.content
+
+    def fetch_async(self):
+        """用异步客户端在截止时间内抓图, 首字节过慢时发出对冲请求, 返回JPEG数据, 失败返回 None."""
+        start_time = time.time()
+        content = self.async_client.get(self.deadline)
+        if content is not None:
+            Logger.log_info(f"拍照耗时: {(time.time() - start_time) * 1000:.0f}ms, 截止时间 {self.deadline:.2f}s, "
+                            f"对冲请求 {self.async_client.hedges} 次")
+        return content
+
+    def stats(self):
+        """异步客户端的首字节/总延迟直方图分位数及对冲、失败、超时次数."""
+        return self.async_client.stats() if self.async_client is not None else {}
+
+
+class CameraGroup:
+    """配置的全部相机; 每台相机固定一个拍照线程(摘要认证的 nonce 按线程保存), 触发时同时拍照并解码,
+    总耗时取决于最慢的相机而不是各相机之和.
+    """
+
+    def __init__(self, sections=None):
+        sections = sections or global_config.get_camera_sections()
+        self.cameras = [Camera(section) for section in sections]
+        self._executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"Camera-{camera.name or 'main'}")
+                           for camera in self.cameras]
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def capture(self, rois=None):
+        """所有相机同时拍照, 返回 [(views, timestamp), ...], 失败的相机为 (None, None); 见 Camera.get_views.
+
+        rois 为各相机检测区域, 为空或相机未启用 roi_decode 时解码整图且不缩小预览图.
+        """
+        futures = []
+        for index, (camera, executor) in enumerate(zip(self.cameras, self._executors)):
+            if rois is not None and camera.roi_decode:
+                futures.append(executor.submit(camera.get_views, rois[index], camera.preview_scale))
+            else:
+                futures.append(executor.submit(camera.get_views, None, 1))
+        return [future.result() for future in futures]
+
+    def close(self):
+        for executor in self._executors:
+            executor.shutdown()
+        for camera in self.cameras:
+            camera.close()
@@ -0,0 +1,276 @@
+"""本地模拟相机及拍照基准测试.
+
+serve: 在本机提供与海康相机相同的ISAPI抓图地址及摘要认证(MD5, qop=auth), 从图片目录轮流返回图片,
+       可配置延迟、抖动、失败率、断开连接率及分辨率, 无需真实相机即可复现拍照性能问题.
+bench: 用 config.ini 中的相机设置(requests 长连接或 client=async)反复拍照, 输出吞吐量及 p50/p95/p99 延迟.
+
+用法:
+    python -m modules.camera_server serve --images images --port 8064 --latency 0.15 --jitter 0.05 --failure-rate 0.01
+    python -m modules.camera_server bench --url http://127.0.0.1:8064/ISAPI/Streaming/channels/101/picture --requests 500
+"""
+import argparse
+import glob
+import hashlib
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+from modules.logger import Logger
+from modules.config import global_config  # 引用全局配置对象
+
+SNAPSHOT_PATH = "/ISAPI/Streaming/channels/101/picture"
+
+
+def md5_hex(text):
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def load_frames(image_dir, width, height):
+    """读取图片目录中的JPEG, 按指定分辨率重新编码; 目录为空时生成一张灰色图片."""
+    paths = sorted(glob.glob(os.path.join(str(image_dir), "*.jpg"))) if image_dir else []
+    frames = []
+    for path in paths:
+        if width and height:
+            img = cv2.imread(path)
+            if img is None:
+                Logger.log_error(f"图片读取失败: {path}")
+                continue
+            frames.append(cv2.imencode(".jpg", cv2.resize(img, (width, height)))[1].tobytes())
+        else:
+            with open(path, "rb") as file:
+                frames.append(file.read())
+    if not frames:
+        img = np.full((height or 1440, width or 2560, 3), 114, dtype=np.uint8)
+        frames.append(cv2.imencode(".jpg", img)[1].tobytes())
+    return frames
+
+
+class CameraServer(ThreadingHTTPServer):
+    """模拟相机: 每个请求一个线程, 按配置注入延迟、抖动及失败."""
+
+    daemon_threads = True
+
+    def __init__(self, address, frames, username, password, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 drop_rate=0.0, nonce_ttl=300.0, realm="IP Camera"):
+        super().__init__(address, SnapshotHandler)
+        self.frames = frames
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.nonce_ttl = nonce_ttl
+        self.realm = realm
+        self.opaque = secrets.token_hex(16)
+        self._nonces = {}  # nonce -> 签发时间
+        self._lock = threading.Lock()
+        self._index = 0
+        self.served = 0
+        self.challenged = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def new_nonce(self):
+        nonce = secrets.token_hex(16)
+        with self._lock:
+            self._nonces[nonce] = time.time()
+        return nonce
+
+    def nonce_state(self, nonce):
+        """返回 "valid"、"stale"(已过期) 或 "unknown"."""
+        with self._lock:
+            issued = self._nonces.get(nonce)
+            if issued is None:
+                return "unknown"
+            if time.time() - issued > self.nonce_ttl:
+                del self._nonces[nonce]
+                return "stale"
+            return "valid"
+
+    def next_frame(self):
+        with self._lock:
+            frame = self.frames[self._index % len(self.frames)]
+            self._index += 1
+            self.served += 1
+            return frame
+
+    def delay(self):
+        """固定延迟加均值为 jitter 的指数分布抖动, 模拟相机编码时间及长尾."""
+        return self.latency + (random.expovariate(1 / self.jitter) if self.jitter > 0 else 0)
+
+
+class SnapshotHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持长连接
+    disable_nagle_algorithm = True  # 响应头与图片分两次写出, 否则每张图片多等待一次延迟确认(约40ms)
+
+    def log_message(self, format, *args):
+        pass  # 不在控制台逐条打印请求
+
+    def send_body(self, status, body=b"", content_type="text/plain", headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def challenge(self, stale=False):
+        server = self.server
+        server.challenged += 1
+        header = (f'Digest realm="{server.realm}", qop="auth", nonce="{server.new_nonce()}", '
+                  f'opaque="{server.opaque}", algorithm=MD5{", stale=TRUE" if stale else ""}')
+        self.send_body(401, headers={"WWW-Authenticate": header})
+
+    def authorized(self):
+        """校验 Authorization 摘要认证; 未通过时已回复 401 质询."""
+        server = self.server
+        header = self.headers.get("Authorization", "")
+        if not header.startswith("Digest "):
+            self.challenge()
+            return False
+
+        params = {key: quoted if quoted else plain
+                  for key, quoted, plain in re.findall(r'(\w+)=(?:"([^"]*)"|([^\s,]+))', header[7:])}
+        state = server.nonce_state(params.get("nonce", ""))
+        if state != "valid":
+            self.challenge(stale=state == "stale")
+            return False
+
+        ha1 = md5_hex(f"{server.username}:{server.realm}:{server.password}")
+        ha2 = md5_hex(f"{self.command}:{params.get('uri', '')}")
+        expected = md5_hex(f"{ha1}:{params['nonce']}:{params.get('nc', '')}:{params.get('cnonce', '')}:auth:{ha2}")
+        if (params.get("username") != server.username or params.get("qop") != "auth" or
+                params.get("uri") != self.path or params.get("response") != expected):
+            self.challenge()
+            return False
+        return True
+
+    def do_GET(self):
+        server = self.server
+        if self.path != SNAPSHOT_PATH:
+            self.send_body(404)
+            return
+        if not self.authorized():
+            return
+
+        time.sleep(server.delay())
+        roll = random.random()
+        if roll < server.drop_rate:
+            server.dropped += 1
+            self.close_connection = True  # 不回复直接断开, 模拟丢包或相机卡死
+            return
+        if roll < server.drop_rate + server.failure_rate:
+            server.failed += 1
+            self.send_body(503)
+            return
+        self.send_body(200, server.next_frame(), "image/jpeg")
+
+
+def serve(args):
+    camera_settings = global_config.get_camera_settings(args.section)
+    frames = load_frames(args.images, args.width, args.height)
+    server = CameraServer((args.host, args.port), frames, camera_settings['username'], camera_settings['password'],
+                          args.latency, args.jitter, args.failure_rate, args.drop_rate, args.nonce_ttl)
+    print(f"模拟相机: http://{args.host}:{args.port}{SNAPSHOT_PATH}, 图片 {len(frames)} 张, Ctrl+C 停止")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"已返回图片 {server.served} 张, 认证质询 {server.challenged} 次, "
+              f"失败 {server.failed} 次, 断开 {server.dropped} 次")
+
+
+def bench(args):
+    from modules.camera import Camera  # 相机依赖 requests 等, 仅基准测试时导入
+
+    cameras = [Camera(args.section) for _ in range(args.concurrency)]
+    if args.url:
+        for camera in cameras:
+            camera.url = args.url
+            if camera.async_client is not None:
+                camera.async_client.url = args.url
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+
+    def run(camera, count):
+        nonlocal failures
+        for _ in range(count):
+            start_time = time.perf_counter()
+            if args.decode:
+                frame, _ = camera.get_frame()
+                ok = frame is not None
+                if ok:
+                    frame.release()
+            else:
+                ok = camera.get_jpeg()[0] is not None
+            elapsed = time.perf_counter() - start_time
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    failures += 1
+
+    per_camera = [args.requests // args.concurrency + (index < args.requests % args.concurrency)
+                  for index in range(args.concurrency)]
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(run, cameras, per_camera))
+    total_time = time.perf_counter() - start_time
+    for camera in cameras:
+        camera.close()
+
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        message = (f"拍照基准测试 {args.requests} 次(并发 {args.concurrency}{', 含解码' if args.decode else ''}): "
+                   f"成功 {len(latencies)}, 失败 {failures}, 吞吐量 {len(latencies) / total_time:.1f} 张/s, "
+                   f"p50 {p50:.1f}ms, p95 {p95:.1f}ms, p99 {p99:.1f}ms, 最大 {max(latencies) * 1000:.1f}ms")
+    else:
+        message = f"拍照基准测试 {args.requests} 次全部失败"
+    Logger.log_info(message)
+    print(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟相机及拍照基准测试")
+    parser.add_argument("--section", default="Camera", help="相机配置节, 用户名及密码取自该节")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="启动模拟相机")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8064)
+    serve_parser.add_argument("--images", default="images", help="图片目录, 为空时返回灰色图片")
+    serve_parser.add_argument("--width", type=int, default=0, help="返回图片宽度, 0 表示保持原图分辨率")
+    serve_parser.add_argument("--height", type=int, default=0, help="返回图片高度")
+    serve_parser.add_argument("--latency", type=float, default=0.0, help="每张图片的固定延迟(s)")
+    serve_parser.add_argument("--jitter", type=float, default=0.0, help="额外延迟的均值(s), 指数分布")
+    serve_parser.add_argument("--failure-rate", type=float, default=0.0, help="返回 503 的比例")
+    serve_parser.add_argument("--drop-rate", type=float, default=0.0, help="不回复直接断开连接的比例")
+    serve_parser.add_argument("--nonce-ttl", type=float, default=300.0, help="nonce 有效期(s), 过期后重新质询")
+
+    bench_parser = subparsers.add_parser("bench", help="按相机配置反复拍照并统计延迟")
+    bench_parser.add_argument("--url", default="", help="抓图地址, 为空时使用配置中的 url")
+    bench_parser.add_argument("--requests", type=int, default=200, help="拍照次数")
+    bench_parser.add_argument("--concurrency", type=int, default=1, help="同时拍照的相机连接数")
+    bench_parser.add_argument("--decode", action="store_true", help="同时统计解码耗时")
+    args = parser.parse_args()
+
+    Logger.setup_logging()
+    if args.command == "serve":
+        serve(args)
+    else:
+        bench(args)
+
+
+if __name__ == "__main__":
+    main()
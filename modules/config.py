@@ -28,7 +28,20 @@ class Config:
             'username': '',
             'password': '',
             'photo_dir': '',
-            'saveRequire': 'false'
+            'saveRequire': 'false',
+            'mode': 'snapshot',
+            'rtsp_url': '',
+            'buffer_size': '4',
+            'after_trigger': 'false',
+            'max_frame_age': '2.0',
+            'roi_decode': 'false',
+            'preview_scale': '2',
+            'pool_size': '10',
+            'client': 'requests',
+            'deadline_ratio': '0.5',
+            'hedge_percentile': '95',
+            'hedge_min_samples': '20',
+            'max_attempts': '3'
         }
         self.config['PLC'] = {
             'ip': '',
@@ -37,9 +50,23 @@ class Config:
             'result_ok_bit': '0',
             'result_ng_bit': '1',
             'heartbeat_bit': '1',
-            'interval': '1.0'
+            'ready_bit': '-1',
+            'recipe_bits': '',
+            'next_recipe_bits': '',
+            'interval': '1.0',
+            'takt_time': '0'
+        }
+        self.config['Inference'] = {
+            'result_dir': '',
+            'warmup_runs': '2',
+            'frame_width': '2560',
+            'frame_height': '1440',
+            'reload_interval': '1.0',
+            'model_cache_mb': '4096',
+            'writer_queue_size': '16',
+            'writer_policy': 'drop',
+            'storage': 'annotated'
         }
-        self.config['Inference'] = {'result_dir': ''}
 
         # 确保目录存在
         config_dir = os.path.dirname(self.config_file)
@@ -50,16 +77,43 @@ class Config:
         with open(self.config_file, 'w') as configfile:
             self.config.write(configfile)
 
+    def get_bits(self, section, option):
+        """读取逗号分隔的IO位列表, 未配置时为空列表."""
+        return [int(bit) for bit in self.config.get(section, option, fallback='').split(',') if bit.strip()]
+
     def get_log_level(self):
         return self.config.get('Logging', 'level', fallback='INFO').upper()
 
-    def get_camera_settings(self):
+    def get_camera_sections(self):
+        """相机配置节: 配置了 [Camera.名称] 时为这些节(多相机同时拍照), 否则为 [Camera]."""
+        sections = [section for section in self.config.sections() if section.startswith('Camera.')]
+        return sections or ['Camera']
+
+    def get_camera_settings(self, section='Camera'):
+        """相机设置; [Camera.名称] 节中未配置的项沿用 [Camera] 中的设置."""
+        def get(option, fallback='', getter=self.config.get):
+            return getter(section, option, fallback=getter('Camera', option, fallback=fallback))
+
         return {
-            'url': self.config.get('Camera', 'url', fallback=''),
-            'username': self.config.get('Camera', 'username', fallback=''),
-            'password': self.config.get('Camera', 'password', fallback=''),
-            'photo_dir': self.config.get('Camera', 'photo_dir', fallback=''),
-            'saveRequire': self.config.getboolean('Camera', 'saveRequire', fallback=False)
+            'url': get('url'),
+            'username': get('username'),
+            'password': get('password'),
+            'photo_dir': get('photo_dir'),
+            'saveRequire': get('saveRequire', False, self.config.getboolean),
+            'mode': get('mode', 'snapshot'),
+            'rtsp_url': get('rtsp_url'),
+            'buffer_size': get('buffer_size', 4, self.config.getint),
+            'after_trigger': get('after_trigger', False, self.config.getboolean),
+            'max_frame_age': get('max_frame_age', 2.0, self.config.getfloat),
+            'roi_decode': get('roi_decode', False, self.config.getboolean),
+            'preview_scale': get('preview_scale', 2, self.config.getint),
+            'pool_size': get('pool_size', 10, self.config.getint),
+            'client': get('client', 'requests'),
+            'deadline_ratio': get('deadline_ratio', 0.5, self.config.getfloat),
+            'hedge_percentile': get('hedge_percentile', 95.0, self.config.getfloat),
+            'hedge_min_samples': get('hedge_min_samples', 20, self.config.getint),
+            'max_attempts': get('max_attempts', 3, self.config.getint),
+            'task': get('task')
         }
 
     def get_plc_settings(self):
@@ -70,12 +124,24 @@ class Config:
             'result_ok_bit': self.config.getint('PLC', 'result_ok_bit', fallback=0),
             'result_ng_bit': self.config.getint('PLC', 'result_ng_bit', fallback=1),
             'heartbeat_bit': self.config.getint('PLC', 'heartbeat_bit', fallback=2),
-            'interval': self.config.getfloat('PLC', 'interval', fallback=1.0)
+            'ready_bit': self.config.getint('PLC', 'ready_bit', fallback=-1),
+            'recipe_bits': self.get_bits('PLC', 'recipe_bits'),
+            'next_recipe_bits': self.get_bits('PLC', 'next_recipe_bits'),
+            'interval': self.config.getfloat('PLC', 'interval', fallback=1.0),
+            'takt_time': self.config.getfloat('PLC', 'takt_time', fallback=0.0)
         }
 
     def get_inference_settings(self):
         return {
-            'result_dir': self.config.get('Inference', 'result_dir', fallback='')
+            'result_dir': self.config.get('Inference', 'result_dir', fallback=''),
+            'warmup_runs': self.config.getint('Inference', 'warmup_runs', fallback=2),
+            'frame_width': self.config.getint('Inference', 'frame_width', fallback=2560),
+            'frame_height': self.config.getint('Inference', 'frame_height', fallback=1440),
+            'reload_interval': self.config.getfloat('Inference', 'reload_interval', fallback=1.0),
+            'model_cache_mb': self.config.getint('Inference', 'model_cache_mb', fallback=4096),
+            'writer_queue_size': self.config.getint('Inference', 'writer_queue_size', fallback=16),
+            'writer_policy': self.config.get('Inference', 'writer_policy', fallback='drop'),
+            'storage': self.config.get('Inference', 'storage', fallback='annotated')
         }
 
 
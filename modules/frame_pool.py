@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+from modules.logger import Logger
+from modules.config import global_config  # 引用全局配置对象
+
+
+class PooledFrame:
+    """图片缓冲区的引用; 每个持有者(工作线程、界面、取流缓冲区)用完后调用一次 release, 引用计数归零时归还到池中."""
+
+    def __init__(self, pool, index, array):
+        self.pool = pool
+        self.index = index
+        self.array = array
+
+    def retain(self):
+        """增加一个持有者, 返回自身, 便于 emit(frame.retain()) 的写法."""
+        if self.pool is not None:
+            self.pool.retain(self)
+        return self
+
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self)
+
+
+class FramePool:
+    """预先分配固定数量的图片缓冲区, 解码直接写入缓冲区, 长时间运行时内存不随拍照次数增长.
+
+    池已用尽或所需尺寸超过缓冲区容量时临时分配(不归还到池中), 并计入 exhausted 次数; 用尽的日志每 log_interval 秒最多一条.
+    """
+
+    def __init__(self, count, shape, log_interval=10.0):
+        self.shape = tuple(shape)
+        self.buffers = [np.empty(self.shape, dtype=np.uint8) for _ in range(count)]
+        self.refs = [0] * count
+        self._free = deque(range(count))
+        self._condition = threading.Condition()
+        self.acquired = 0
+        self.peak = 0
+        self.exhausted = 0
+        self.log_interval = log_interval
+        self._logged_time = None
+        self._logged_exhausted = 0
+
+    @staticmethod
+    def wrap(array):
+        """将池外分配的图片包装为相同接口, retain/release 不做任何事."""
+        return PooledFrame(None, -1, array)
+
+    def acquire(self, shape, timeout=0.0):
+        """取一块空闲缓冲区(引用计数为1), 返回其前部 shape 大小的视图; 池已用尽时最多等待 timeout 秒."""
+        shape = tuple(int(v) for v in shape)
+        size = int(np.prod(shape))
+        if not self.buffers or size > self.buffers[0].size:
+            self.exhausted += 1
+            return self.wrap(np.empty(shape, dtype=np.uint8))
+
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._free, timeout):
+                self.exhausted += 1
+                now = time.monotonic()
+                if self._logged_time is None or now - self._logged_time >= self.log_interval:
+                    Logger.log_error(f"图片缓冲区已用尽({len(self.buffers)}块), 临时分配"
+                                     f"(自上次记录以来 {self.exhausted - self._logged_exhausted} 次)")
+                    self._logged_time = now
+                    self._logged_exhausted = self.exhausted
+                return self.wrap(np.empty(shape, dtype=np.uint8))
+            index = self._free.popleft()
+            self.refs[index] = 1
+            self.acquired += 1
+            self.peak = max(self.peak, len(self.buffers) - len(self._free))
+        return PooledFrame(self, index, self.buffers[index].reshape(-1)[:size].reshape(shape))
+
+    def retain(self, frame):
+        with self._condition:
+            self.refs[frame.index] += 1
+
+    def release(self, frame):
+        with self._condition:
+            if self.refs[frame.index] <= 0:
+                Logger.log_error(f"图片缓冲区 {frame.index} 重复释放")
+                return
+            self.refs[frame.index] -= 1
+            if self.refs[frame.index] == 0:
+                self._free.append(frame.index)
+                self._condition.notify()
+
+    def stats(self):
+        """缓冲区数量、当前占用、峰值占用、临时分配次数及池内存."""
+        with self._condition:
+            return {
+                "size": len(self.buffers),
+                "in_use": len(self.buffers) - len(self._free),
+                "peak": self.peak,
+                "acquired": self.acquired,
+                "exhausted": self.exhausted,
+                "mb": sum(buffer.nbytes for buffer in self.buffers) / 1024 / 1024,
+            }
+
+
+# 创建全局图片缓冲池实例, 缓冲区尺寸为相机分辨率
+frame_pool = FramePool(global_config.get_camera_settings()['pool_size'],
+                       (global_config.get_inference_settings()['frame_height'],
+                        global_config.get_inference_settings()['frame_width'], 3))
@@ -0,0 +1,254 @@
+import ast
+import os
+import shutil
+import time
+import cv2
+import numpy as np
+import yaml
+from modules.logger import Logger
+
+
+# 检测结果结构化数组, 每条记录为 float32 的 (x1, y1, x2, y2, conf, cls), 可由 (N, 6) 数组零拷贝视图得到
+DETECTION_DTYPE = np.dtype([("box", np.float32, (4,)), ("conf", np.float32), ("cls", np.float32)])
+
+
+def as_detections(data):
+    """将 (N, 6) 的 [x1, y1, x2, y2, conf, cls] 数组转换为结构化检测结果数组, float32 连续数组时不复制."""
+    return np.ascontiguousarray(data, dtype=np.float32).view(DETECTION_DTYPE).reshape(-1)
+
+
+def letterbox(img, new_shape, dst=None, color=114):
+    """等比例缩放图像并居中填充到模型输入尺寸, 返回缩放比例及左上角偏移."""
+    h, w = img.shape[:2]
+    new_h, new_w = new_shape
+    ratio = min(new_h / h, new_w / w)
+    resized_h, resized_w = int(round(h * ratio)), int(round(w * ratio))
+    top, left = (new_h - resized_h) // 2, (new_w - resized_w) // 2
+
+    if dst is None:
+        dst = np.empty((new_h, new_w, 3), dtype=np.uint8)
+    dst.fill(color)
+    dst[top:top + resized_h, left:left + resized_w] = cv2.resize(img, (resized_w, resized_h),
+                                                                 interpolation=cv2.INTER_LINEAR)
+    return dst, ratio, (left, top)
+
+
+def nms(boxes, scores, iou_threshold):
+    """贪心非极大值抑制, IoU计算为向量化运算, 返回保留框的索引."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def exported_path_is_fresh(exported_path, weight_path):
+    """导出文件存在且不早于权重文件时, 可直接复用."""
+    return os.path.exists(exported_path) and os.path.getmtime(exported_path) >= os.path.getmtime(weight_path)
+
+
+def export_stem(weight_path, imgsz):
+    """导出文件的路径前缀: 权重路径加输入尺寸(高x宽), 输入尺寸改变时重新导出, 不同尺寸的导出模型互不覆盖."""
+    height, width = (imgsz, imgsz) if isinstance(imgsz, int) else imgsz
+    return f"{os.path.splitext(weight_path)[0]}_{height}x{width}"
+
+
+def fp32_onnx_path(weight_path, imgsz):
+    """权重按指定输入尺寸导出的FP32 ONNX模型路径."""
+    return f"{export_stem(weight_path, imgsz)}.onnx"
+
+
+def int8_onnx_path(weight_path, imgsz):
+    """权重按指定输入尺寸导出并量化的INT8 ONNX模型路径."""
+    return f"{export_stem(weight_path, imgsz)}.int8.onnx"
+
+
+class ExportedModel:
+    """导出模型推理基类, 负责前处理(letterbox)与后处理(NMS, 坐标还原)."""
+
+    max_wh = 7680  # 按类别偏移框坐标, 使一次NMS即可按类别独立抑制
+    iou = 0.7
+    max_det = 300
+
+    def __init__(self, names, imgsz):
+        self.names = names
+        self.imgsz = imgsz
+        # 预分配前处理缓冲区, 每次推理复用, 避免逐帧申请内存
+        self._canvas = np.empty((imgsz[0], imgsz[1], 3), dtype=np.uint8)
+        self._blob = np.empty((1, 3, imgsz[0], imgsz[1]), dtype=np.float32)
+
+    def infer(self, blob):
+        """执行推理, 返回模型原始输出 (1, 4 + 类别数, 候选框数)."""
+        raise NotImplementedError
+
+    def preprocess(self, img, blob=None):
+        """BGR图像letterbox后写入预分配的NCHW RGB float32输入缓冲区(blob 为空时为默认缓冲区)."""
+        blob = self._blob if blob is None else blob
+        _, ratio, pad = letterbox(img, self.imgsz, dst=self._canvas)
+        np.multiply(self._canvas[..., ::-1].transpose(2, 0, 1), 1 / 255.0, out=blob[0], casting="unsafe")
+        return blob, ratio, pad
+
+    def predict(self, img, conf, classes=None):
+        """对单张图片进行预测, 返回结构化检测结果数组, classes 指定时只保留这些类别."""
+        blob, ratio, pad = self.preprocess(img)
+        output = self.infer(blob)
+        return self.postprocess(output, conf, ratio, pad, img.shape, classes)
+
+    def predict_batch(self, imgs, conf, classes=None):
+        """对一批图片逐张预测(导出模型为固定批大小1), 返回每张图片的检测结果数组列表."""
+        return [self.predict(img, conf, classes) for img in imgs]
+
+    def postprocess(self, output, conf, ratio, pad, img_shape, classes=None):
+        """置信度及类别过滤、NMS并将框坐标还原到原图."""
+        pred = output[0].T  # (候选框数, 4 + 类别数)
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        confs = scores[np.arange(len(cls)), cls]
+
+        mask = confs >= conf
+        if classes is not None:
+            mask &= np.isin(cls, classes)  # 非目标类别不参与NMS
+        pred, cls, confs = pred[mask], cls[mask], confs[mask]
+        if len(pred) == 0:
+            return as_detections(np.empty((0, 6), dtype=np.float32))
+
+        # cx, cy, w, h -> x1, y1, x2, y2
+        boxes = np.empty((len(pred), 4), dtype=np.float32)
+        boxes[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        boxes[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+
+        keep = nms(boxes + (cls * self.max_wh)[:, None], confs, self.iou)[:self.max_det]
+
+        # 还原到原图坐标, 直接写入 (N, 6) 结果数组
+        data = np.empty((len(keep), 6), dtype=np.float32)
+        data[:, :4] = (boxes[keep] - np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)) / ratio
+        data[:, [0, 2]] = data[:, [0, 2]].clip(0, img_shape[1])
+        data[:, [1, 3]] = data[:, [1, 3]].clip(0, img_shape[0])
+        data[:, 4] = confs[keep]
+        data[:, 5] = cls[keep]
+        return as_detections(data)
+
+
+class OpenVinoModel(ExportedModel):
+    """OpenVINO CPU推理后端, 首次使用时由 .pt 导出 IR 并缓存在权重文件旁."""
+
+    def __init__(self, ir_dir, streams=1, threads=0):
+        import openvino as ov
+
+        with open(os.path.join(ir_dir, "metadata.yaml"), encoding="utf-8") as f:
+            metadata = yaml.safe_load(f)
+        super().__init__(metadata["names"], tuple(metadata["imgsz"]))
+
+        xml_path = next(os.path.join(ir_dir, name) for name in os.listdir(ir_dir) if name.endswith(".xml"))
+        config = {"NUM_STREAMS": str(streams)}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = str(threads)
+
+        core = ov.Core()
+        self.compiled_model = core.compile_model(core.read_model(xml_path), "CPU", config)
+        self.request = self.compiled_model.create_infer_request()
+        self.streams = streams
+
+        # 多个推理流时按批推理经异步推理队列并行执行, 每个推理请求使用各自的输入缓冲区
+        self.queue = None
+        if streams > 1:
+            self.queue = ov.AsyncInferQueue(self.compiled_model, streams)
+            self.queue.set_callback(self._on_done)
+            self._queue_blobs = [np.empty_like(self._blob) for _ in range(len(self.queue))]
+            self._queue_outputs = None
+
+    @classmethod
+    def from_weights(cls, weight_path, streams=1, threads=0, imgsz=640):
+        """加载权重按指定输入尺寸导出的 IR, 不存在或已过期时重新导出."""
+        ir_dir = f"{export_stem(weight_path, imgsz)}_openvino_model"
+        if not exported_path_is_fresh(os.path.join(ir_dir, "metadata.yaml"), weight_path):
+            from ultralytics import YOLO
+
+            start_time = time.time()
+            # 导出目录固定为权重同名的 _openvino_model, 改名为带输入尺寸的目录
+            exported_dir = YOLO(weight_path).export(format="openvino", imgsz=imgsz)
+            shutil.rmtree(ir_dir, ignore_errors=True)
+            os.replace(exported_dir, ir_dir)
+            Logger.log_info(f"导出OpenVINO模型 {ir_dir} 耗时: {time.time() - start_time:.2f}s")
+        return cls(ir_dir, streams=streams, threads=threads)
+
+    def infer(self, blob):
+        return self.request.infer({0: blob})[0]
+
+    def _on_done(self, request, index):
+        self._queue_outputs[index] = request.get_output_tensor(0).data.copy()
+
+    def predict_batch(self, imgs, conf, classes=None):
+        """对一批图片预测; 多个推理流时前处理下一张图片的同时, 之前的图片在各推理流上并行推理."""
+        if self.queue is None or len(imgs) < 2:
+            return super().predict_batch(imgs, conf, classes)
+
+        self._queue_outputs = [None] * len(imgs)
+        params = []
+        for index, img in enumerate(imgs):
+            request_id = self.queue.get_idle_request_id()  # 等待空闲请求, start_async 将使用该请求
+            blob, ratio, pad = self.preprocess(img, self._queue_blobs[request_id])
+            params.append((ratio, pad, img.shape))
+            self.queue.start_async({0: blob}, index, share_inputs=True)
+        self.queue.wait_all()
+        return [self.postprocess(output, conf, ratio, pad, shape, classes)
+                for output, (ratio, pad, shape) in zip(self._queue_outputs, params)]
+
+
+class OnnxModel(ExportedModel):
+    """ONNX Runtime推理后端, 输入输出绑定到预分配缓冲区并在多次调用间复用."""
+
+    def __init__(self, onnx_path, threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        super().__init__(ast.literal_eval(metadata["names"]), tuple(ast.literal_eval(metadata["imgsz"])))
+
+        # 导出时固定输入尺寸, 输出形状确定, 可直接预分配输出缓冲区
+        input_meta = self.session.get_inputs()[0]
+        output_meta = self.session.get_outputs()[0]
+        self._output = np.empty(output_meta.shape, dtype=np.float32)
+
+        self.binding = self.session.io_binding()
+        self.binding.bind_ortvalue_input(input_meta.name, ort.OrtValue.ortvalue_from_numpy(self._blob))
+        self.binding.bind_ortvalue_output(output_meta.name, ort.OrtValue.ortvalue_from_numpy(self._output))
+
+    @classmethod
+    def from_weights(cls, weight_path, threads=0, imgsz=640, precision="fp32"):
+        """加载权重对应的 .onnx, 不存在或已过期时重新导出; INT8模型需先由量化工具生成."""
+        if precision == "int8":
+            int8_path = int8_onnx_path(weight_path, imgsz)
+            if not exported_path_is_fresh(int8_path, weight_path):
+                raise FileNotFoundError(f"INT8模型 {int8_path} 不存在或已过期, 请先运行 python -m modules.quantize")
+            return cls(int8_path, threads=threads)
+
+        onnx_path = fp32_onnx_path(weight_path, imgsz)
+        if not exported_path_is_fresh(onnx_path, weight_path):
+            from ultralytics import YOLO
+
+            start_time = time.time()
+            # 导出文件固定为权重同名的 .onnx, 改名为带输入尺寸的路径
+            os.replace(YOLO(weight_path).export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True), onnx_path)
+            Logger.log_info(f"导出ONNX模型 {onnx_path} 耗时: {time.time() - start_time:.2f}s")
+        return cls(onnx_path, threads=threads)
+
+    def infer(self, blob):
+        # blob 即已绑定的输入缓冲区, 推理结果直接写入预分配的输出缓冲区
+        self.session.run_with_iobinding(self.binding)
+        return self._output
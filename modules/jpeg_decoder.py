@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+from modules.logger import Logger
+from modules.frame_pool import frame_pool  # 引用全局图片缓冲池
+
+
+class JpegDecoder:
+    """从同一张相机JPEG得到检测用的区域图及界面显示用的缩小预览图, 解码结果写入图片缓冲池.
+
+    安装 libjpeg-turbo (PyTurboJPEG) 时: 直接解码到缓冲区; 预览图在DCT域按 1/2、1/4、1/8 缩放解码; 检测区域先按MCU
+    对齐无损裁剪, 只解码区域内的数据. 未安装时整图解码一次后复制到缓冲区, 区域图为整图的视图, 预览图由整图缩小得到.
+    """
+
+    # TurboJPEG 色度抽样方式对应的MCU尺寸 (宽, 高): 444, 422, 420, GRAY, 440, 411
+    MCU_SIZES = {0: (8, 8), 1: (16, 8), 2: (16, 16), 3: (8, 8), 4: (8, 16), 5: (32, 8)}
+
+    def __init__(self, pool=frame_pool):
+        self.pool = pool
+        try:
+            from turbojpeg import TurboJPEG
+            self.turbo = TurboJPEG()
+        except Exception as e:  # 未安装 PyTurboJPEG 或找不到 libjpeg-turbo 动态库
+            self.turbo = None
+            Logger.log_info(f"libjpeg-turbo 不可用, 使用OpenCV整图解码: {str(e)}")
+
+    @staticmethod
+    def clip_roi(roi, width, height):
+        if roi is None:
+            return 0, 0, width, height
+        x1, y1, x2, y2 = (int(v) for v in roi)
+        x1, y1 = min(max(x1, 0), width - 1), min(max(y1, 0), height - 1)
+        return x1, y1, max(min(x2, width), x1 + 1), max(min(y2, height), y1 + 1)
+
+    def decode(self, data, scale=1):
+        """按 1/scale (1、2、4、8) 缩放解码到缓冲池, 返回 PooledFrame, 解码失败返回 None."""
+        if self.turbo is not None:
+            width, height, _, _ = self.turbo.decode_header(data)
+            shape = (-(-height // scale), -(-width // scale), 3)  # libjpeg-turbo 缩放尺寸向上取整
+            frame = self.pool.acquire(shape)
+            try:
+                self.turbo.decode(data, scaling_factor=(1, scale) if scale > 1 else None, dst=frame.array)
+            except Exception:
+                frame.release()
+                raise
+            return frame
+
+        flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), flags[scale])
+        if img is None:
+            return None
+        frame = self.pool.acquire(img.shape)
+        np.copyto(frame.array, img)  # OpenCV 不能解码到指定数组, 复制后临时图片随即释放
+        return frame
+
+    def decode_views(self, data, roi=None, preview_scale=2):
+        """返回 {"roi": 区域图, "offset": 区域图左上角在原图中的坐标, "preview": 预览图, "shape": 原图(高, 宽),
+        "preview_frame": 预览图缓冲区, "frames": 所用缓冲区}; 用完后对 frames 中的每一项调用 release.
+
+        roi 为原图坐标 (x1, y1, x2, y2), 为空时区域图即整图; 解码失败返回 None.
+        """
+        if self.turbo is None:
+            frame = self.decode(data)
+            if frame is None:
+                return None
+            views = self.views_from_frame(frame, roi, preview_scale)
+            frame.release()  # views 已持有该缓冲区
+            return views
+
+        width, height, subsample, _ = self.turbo.decode_header(data)
+        x1, y1, x2, y2 = self.clip_roi(roi, width, height)
+        preview = self.decode(data, preview_scale)
+        if preview_scale == 1:
+            roi_frame = preview.retain()  # 预览图即整图, 不再重复解码
+            roi_img = preview.array[y1:y2, x1:x2]
+        else:
+            if (x1, y1, x2, y2) == (0, 0, width, height):
+                roi_frame = self.decode(data)
+            else:
+                # 无损裁剪要求左上角与MCU对齐, 向左上方扩展到对齐位置
+                mcu_w, mcu_h = self.MCU_SIZES.get(subsample, (16, 16))
+                x1, y1 = x1 // mcu_w * mcu_w, y1 // mcu_h * mcu_h
+                roi_frame = self.decode(self.turbo.crop(data, x1, y1, x2 - x1, y2 - y1))
+            roi_img = roi_frame.array
+        return {"roi": roi_img, "offset": (x1, y1), "preview": preview.array, "shape": (height, width),
+                "preview_frame": preview, "frames": [roi_frame, preview]}
+
+    def views_from_frame(self, frame, roi=None, preview_scale=2):
+        """由已解码的整图(PooledFrame)得到区域图(视图)及预览图, 返回的 views 另外持有一次该缓冲区, views["frame"] 为整图."""
+        height, width = frame.array.shape[:2]
+        x1, y1, x2, y2 = self.clip_roi(roi, width, height)
+        frames = [frame.retain()]
+        preview_frame = frame
+        if preview_scale > 1:
+            preview_frame = self.pool.acquire((height // preview_scale, width // preview_scale, 3))
+            cv2.resize(frame.array, (width // preview_scale, height // preview_scale), dst=preview_frame.array,
+                       interpolation=cv2.INTER_AREA)
+            frames.append(preview_frame)
+        return {"roi": frame.array[y1:y2, x1:x2], "offset": (x1, y1), "preview": preview_frame.array,
+                "shape": (height, width), "preview_frame": preview_frame, "frame": frame, "frames": frames}
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from ultralytics import YOLO
+from modules.logger import Logger
+from modules.config import global_config  # 引用全局配置对象
+
+
+class ModelRegistry:
+    """进程级模型缓存, 按权重路径+文件修改时间缓存已加载的模型.
+
+    超出内存预算时按最近最少使用(LRU)淘汰模型; 加载在锁外进行, 后台预加载不会阻塞正在使用其他模型的检测.
+    """
+
+    def __init__(self, budget_mb=0):
+        self.budget = budget_mb * 1024 * 1024  # 0 表示不限制
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (signature, model, size), 末尾为最近使用
+        self._loading = {}  # key -> 加载完成事件, 避免同一模型被并发重复加载
+        self._warm = set()  # 已预热模型的 key
+        self._pinned = set()  # 当前任务及相机绑定任务所用模型的 key, 不会被淘汰
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    @staticmethod
+    def key(path, tag="torch"):
+        return os.path.abspath(path), tag
+
+    @staticmethod
+    def file_signature(path):
+        """权重文件签名, 文件被替换后签名随之变化."""
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def estimate_size(model, path):
+        """估算模型常驻内存: torch模型按参数字节数, 其余按权重文件大小."""
+        try:
+            return sum(p.numel() * p.element_size() for p in model.model.parameters())
+        except AttributeError:
+            return os.path.getsize(path)
+
+    def get(self, path, loader=YOLO, tag="torch"):
+        """获取模型, 首次使用、已被淘汰或权重文件变化时才重新加载."""
+        key = self.key(path, tag)
+        signature = self.file_signature(path)
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == signature:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+
+                event = self._loading.get(key)
+                if event is None:
+                    event = self._loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            event.wait()  # 其他线程正在加载同一模型, 等待后重新查找
+
+        try:
+            start_time = time.time()
+            model = loader(path)
+            elapsed = time.time() - start_time
+            size = self.estimate_size(model, path)
+            with self._lock:
+                self._entries[key] = (signature, model, size)
+                self._warm.discard(key)
+                self.load_time += elapsed
+                self._evict(keep=key)
+            Logger.log_info(f"加载模型 {path} ({tag}) 耗时: {elapsed:.2f}s, 约 {size / 1024 / 1024:.0f}MB")
+            return model
+        finally:
+            with self._lock:
+                del self._loading[key]
+            event.set()
+
+    def touch(self, key):
+        """检测使用模型时更新其最近使用顺序, 不检查权重文件也不计入命中次数."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def pin(self, keys):
+        """设置不可淘汰的模型(当前任务及相机绑定任务所用模型), 替换之前的设置."""
+        with self._lock:
+            self._pinned = set(keys)
+
+    def _evict(self, keep):
+        """超出内存预算时淘汰最近最少使用的模型, 刚加载及正在使用的模型除外."""
+        if not self.budget:
+            return
+        while self.resident_size() > self.budget:
+            key = next((k for k in self._entries if k != keep and k not in self._pinned), None)
+            if key is None:
+                Logger.log_error(f"内存预算不足, 但其余模型均在使用中, 常驻 {self.resident_size() / 1024 / 1024:.0f}MB")
+                return
+            del self._entries[key]
+            self._warm.discard(key)
+            self.evictions += 1
+            Logger.log_info(f"内存预算不足, 释放模型 {key[0]} ({key[1]})")
+
+    def resident_size(self):
+        return sum(entry[2] for entry in self._entries.values())
+
+    def stats(self):
+        """缓存命中/未命中/淘汰次数、累计加载耗时及常驻模型占用."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_time": self.load_time,
+                "models": len(self._entries),
+                "resident_mb": self.resident_size() / 1024 / 1024,
+            }
+
+    def _key_of(self, model):
+        return next((key for key, entry in self._entries.items() if entry[1] is model), None)
+
+    def is_warm(self, model):
+        """模型是否已完成预热."""
+        with self._lock:
+            return self._key_of(model) in self._warm
+
+    def mark_warm(self, model):
+        """标记模型已完成预热, 后续复用时无需再次预热."""
+        with self._lock:
+            key = self._key_of(model)
+            if key is not None:
+                self._warm.add(key)
+
+    def clear(self):
+        """释放全部已加载模型."""
+        with self._lock:
+            self._entries.clear()
+            self._warm.clear()
+
+
+# 创建全局模型缓存实例
+model_registry = ModelRegistry(global_config.get_inference_settings()['model_cache_mb'])
@@ -15,6 +15,9 @@ class PLC:
         self.result_ok_bit = plc_settings['result_ok_bit']
         self.result_ng_bit = plc_settings['result_ng_bit']
         self.heartbeat_bit = plc_settings['heartbeat_bit']
+        self.ready_bit = plc_settings['ready_bit']  # 模型就绪信号输出位, -1表示未接线
+        self.recipe_bits = plc_settings['recipe_bits']  # 配方号输入位, 低位在前, 为空表示不由PLC选择任务
+        self.next_recipe_bits = plc_settings['next_recipe_bits']  # 下一配方号输入位, 用于换型前预加载模型
         self.interval = plc_settings['interval']
 
         self.client = ModbusTcpClient(self.ip, port=self.port, timeout=5, retries=3)
@@ -56,6 +59,16 @@ class PLC:
             Logger.log_error(f"写入IO错误: {e}.")
             return None
 
+    def read_recipe(self, bits, recipe_bits=None):
+        """由输入位状态计算配方号, 默认读取当前配方号输入位."""
+        recipe_bits = self.recipe_bits if recipe_bits is None else recipe_bits
+        return sum(1 << index for index, bit in enumerate(recipe_bits) if bits[bit])
+
+    def write_ready(self, value):
+        """输出模型就绪信号(如已配置就绪位)."""
+        if self.ready_bit >= 0:
+            self.write_bit(self.ready_bit, value)
+
     def close(self):
         """与IO板断开连接."""
         if self.client.connected:
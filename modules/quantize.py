@@ -0,0 +1,232 @@
+"""INT8训练后量化工具.
+
+从拍照存档目录(photo_dir/yyyy-mm-dd)抽取图片作为校准数据, 将任务模型量化为CPU用INT8 ONNX模型,
+并在另一批存档图片上对比FP32与INT8模型的逐目标置信度及OK/NG判定, 输出对比报告.
+校准及对比均按现场方式进行: 相机启用 roi_decode 时只解码检测区域, 按任务的检测模式(整图/裁剪/瓦片)及二次检测判定.
+
+用法: python -m modules.quantize --task 3UG-64530-3AO --section Camera --calib 200 --eval 300
+量化完成且判定一致率满足要求后, 在 setting.json 对应模型中设置 "backend": "onnx", "precision": "int8".
+"""
+import argparse
+import csv
+import glob
+import os
+import random
+import re
+import time
+import onnx
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from modules.logger import Logger
+from modules.config import global_config  # 引用全局配置对象
+from modules.inference_backend import OnnxModel, export_stem, fp32_onnx_path, int8_onnx_path
+from modules.jpeg_decoder import JpegDecoder
+from modules.tiling import crop_windows
+from modules.yolo_model import YoloModel
+
+
+class PhotoReader:
+    """按现场相机的方式解码存档图片: 相机启用 roi_decode 时只解码该相机负责判定的目标区域."""
+
+    def __init__(self, yolo_model, section="Camera"):
+        camera_settings = global_config.get_camera_settings(section)
+        self.indices = yolo_model.camera_targets(section.partition('.')[2])
+        self.roi = yolo_model.roi(self.indices) if camera_settings['roi_decode'] else None
+        self.preview_scale = camera_settings['preview_scale'] if camera_settings['roi_decode'] else 1
+        self.decoder = JpegDecoder()
+
+    def read(self, path):
+        """返回 views(见 JpegDecoder.decode_views, 用完后对 frames 中的每一项调用 release), 读取失败返回 None."""
+        try:
+            with open(path, "rb") as f:
+                views = self.decoder.decode_views(f.read(), self.roi, self.preview_scale)
+        except Exception as e:
+            Logger.log_error(f"图片读取失败: {path}, {str(e)}")
+            return None
+        if views is None:
+            Logger.log_error(f"图片读取失败: {path}")
+        return views
+
+
+def model_inputs(yolo_model, img, offset=(0, 0)):
+    """第一个模型在现场实际的输入: 整图模式为整图(区域图), 裁剪/瓦片模式为各检测窗口."""
+    if yolo_model.detect_mode == "full":
+        return [img]
+    yolo_model.plan_windows(img.shape, offset)
+    _, origins, size = yolo_model.window_plan
+    return crop_windows(img, origins, size)
+
+
+class CalibrationReader(CalibrationDataReader):
+    """按ONNX Runtime CalibrationDataReader接口逐个提供校准输入, 输入与现场推理时第一个模型的输入相同."""
+
+    def __init__(self, model, yolo_model, photo_reader, image_paths):
+        self.model = model
+        self.yolo_model = yolo_model
+        self.photo_reader = photo_reader
+        self.input_name = model.session.get_inputs()[0].name
+        self.image_paths = iter(image_paths)
+        self.pending = []
+
+    def get_next(self):
+        while not self.pending:
+            path = next(self.image_paths, None)
+            if path is None:
+                return None
+            views = self.photo_reader.read(path)
+            if views is None:
+                continue
+            # 窗口为图片缓冲区的视图, 复制后即可释放缓冲区
+            self.pending = [window.copy() for window in model_inputs(self.yolo_model, views["roi"], views["offset"])]
+            for frame in views["frames"]:
+                frame.release()
+        blob, _, _ = self.model.preprocess(self.pending.pop(0))
+        return {self.input_name: blob.copy()}  # 输入缓冲区会被下一张图片复用
+
+
+def sample_photos(photo_dir, calib_num, eval_num, seed=0):
+    """从拍照存档中随机抽取互不重叠的校准集与评估集."""
+    paths = sorted(glob.glob(os.path.join(str(photo_dir), "*", "*.jpg")))
+    if not paths:
+        raise FileNotFoundError(f"拍照存档目录 {photo_dir} 下没有图片")
+
+    random.Random(seed).shuffle(paths)
+    calib_paths = paths[:calib_num]
+    eval_paths = paths[calib_num:calib_num + eval_num] or calib_paths  # 存档不足时退化为在校准集上评估
+    return calib_paths, eval_paths
+
+
+def head_nodes(onnx_path):
+    """检测头卷积分支之后的节点(拼接、DFL、Sigmoid、框解码); 框坐标(0~imgsz)与类别分数(0~1)在此拼接为同一张量,
+    共用一个量化尺度会使分数失去精度, 这些节点保持FP32."""
+    graph = onnx.load(onnx_path).graph
+    heads = [int(match.group(1)) for match in (re.match(r"/model\.(\d+)/", node.name) for node in graph.node) if match]
+    if not heads:
+        return []
+    prefix = f"/model.{max(heads)}/"
+    branch = re.compile(re.escape(prefix) + r"(one2one_)?cv\d")  # 各尺度的卷积分支, 正常量化
+    return [node.name for node in graph.node if node.name.startswith(prefix) and not branch.match(node.name)]
+
+
+def quantize_model(yolo_model, photo_reader, calib_paths):
+    """以存档图片为校准数据, 将任务第一个模型的FP32 ONNX模型静态量化为INT8, 检测头末端不量化."""
+    model_config = yolo_model.model_configs[0]
+    weight_path = model_config["path"]
+    imgsz = model_config.get("imgsz", 640)
+    fp32_model = OnnxModel.from_weights(weight_path, imgsz=imgsz)
+    fp32_path = fp32_onnx_path(weight_path, imgsz)
+    prep_path = f"{export_stem(weight_path, imgsz)}.prep.onnx"
+    int8_path = int8_onnx_path(weight_path, imgsz)
+
+    quant_pre_process(fp32_path, prep_path)  # 形状推断及图优化, 量化前的推荐预处理
+    excluded = head_nodes(prep_path)
+    reader = CalibrationReader(fp32_model, yolo_model, photo_reader, calib_paths)
+    start_time = time.time()
+    quantize_static(prep_path, int8_path, reader,
+                    quant_format=QuantFormat.QDQ,
+                    per_channel=True,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    nodes_to_exclude=excluded)
+    os.remove(prep_path)
+    Logger.log_info(f"INT8量化完成 {int8_path}, 校准图片 {len(calib_paths)} 张, 检测头末端 {len(excluded)} 个节点保持FP32, "
+                    f"耗时: {time.time() - start_time:.2f}s")
+    return fp32_model, OnnxModel(int8_path)
+
+
+def task_model(yolo_model, model, precision):
+    """按任务配置新建判定用的 YoloModel, 第一个模型换为指定的ONNX模型, 检测模式及二次检测与现场相同."""
+    swapped = YoloModel(yolo_model.config_path, yolo_model.task_name, preload=False)
+    path, _, _, conf, _ = swapped.models[0]
+    swapped.models[0] = (path, lambda _: model, f"quantize:{precision}", conf, "onnx")
+    return swapped
+
+
+def compare(yolo_model, fp32_model, int8_model, photo_reader, eval_paths, report_path):
+    """在同一批图片上按现场判定流程对比FP32与INT8模型, 写出逐目标CSV报告并返回汇总."""
+    fp32_task = task_model(yolo_model, fp32_model, "fp32")
+    int8_task = task_model(yolo_model, int8_model, "int8")
+    indices = photo_reader.indices if photo_reader.indices is not None else range(len(yolo_model.targets))
+    frames = target_agree = verdict_agree = 0
+    conf_diff = fp32_time = int8_time = 0.0
+
+    with open(report_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["image", "index", "label", "target_conf", "fp32_conf", "int8_conf", "fp32_result",
+                         "int8_result"])
+
+        for path in eval_paths:
+            views = photo_reader.read(path)
+            if views is None:
+                continue
+
+            start_time = time.perf_counter()
+            fp32_predictions, fp32_ready = fp32_task.judge(views["roi"], views["offset"], photo_reader.indices)
+            fp32_time += time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            int8_predictions, int8_ready = int8_task.judge(views["roi"], views["offset"], photo_reader.indices)
+            int8_time += time.perf_counter() - start_time
+            for frame in views["frames"]:
+                frame.release()
+
+            for index, fp32, int8 in zip(indices, fp32_predictions, int8_predictions):
+                fp32_ok = fp32["passed"]
+                int8_ok = int8["passed"]
+                target_agree += fp32_ok == int8_ok
+                conf_diff += abs(float(fp32["predict_conf"]) - float(int8["predict_conf"]))
+                writer.writerow([os.path.basename(path), index, fp32["label"], fp32["target_conf"],
+                                 f"{fp32['predict_conf']:.2f}", f"{int8['predict_conf']:.2f}",
+                                 "OK" if fp32_ok else "NG", "OK" if int8_ok else "NG"])
+
+            verdict_agree += fp32_ready == int8_ready
+            frames += 1
+
+    targets = frames * len(indices)
+    return {
+        "frames": frames,
+        "verdict_agreement": verdict_agree / frames if frames else 0.0,
+        "target_agreement": target_agree / targets if targets else 0.0,
+        "mean_conf_diff": conf_diff / targets if targets else 0.0,
+        "fp32_ms": fp32_time / frames * 1000 if frames else 0.0,
+        "int8_ms": int8_time / frames * 1000 if frames else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用拍照存档图片对任务模型做INT8量化并输出对比报告")
+    parser.add_argument("--setting", default="config/setting.json", help="模型配置文件")
+    parser.add_argument("--task", default=None, help="任务名, 默认第一个任务")
+    parser.add_argument("--section", default="Camera", help="相机配置节, 存档目录及 roi_decode 取自该节")
+    parser.add_argument("--calib", type=int, default=200, help="校准图片数量")
+    parser.add_argument("--eval", type=int, default=300, help="评估图片数量")
+    parser.add_argument("--seed", type=int, default=0, help="抽样随机种子")
+    args = parser.parse_args()
+
+    Logger.setup_logging()
+    yolo_model = YoloModel(args.setting, args.task, preload=False)
+    if yolo_model.detect_mode == "classify":
+        raise ValueError("分类判定模式仅支持torch后端, 不能量化")
+    photo_reader = PhotoReader(yolo_model, args.section)
+
+    photo_dir = global_config.get_camera_settings(args.section)['photo_dir']
+    calib_paths, eval_paths = sample_photos(photo_dir, args.calib, args.eval, args.seed)
+    fp32_model, int8_model = quantize_model(yolo_model, photo_reader, calib_paths)
+
+    # 报告保存在 result_dir/task_name/quantize
+    report_dir = os.path.join(str(global_config.get_inference_settings()['result_dir']),
+                              str(yolo_model.task_name), "quantize")
+    os.makedirs(report_dir, exist_ok=True)
+    report_path = os.path.join(report_dir, f"int8_report_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+    summary = compare(yolo_model, fp32_model, int8_model, photo_reader, eval_paths, report_path)
+
+    message = (f"量化对比 {summary['frames']} 张: 整体判定一致率 {summary['verdict_agreement']:.2%}, "
+               f"目标判定一致率 {summary['target_agreement']:.2%}, "
+               f"平均置信度差 {summary['mean_conf_diff']:.3f}, "
+               f"FP32 {summary['fp32_ms']:.1f}ms, INT8 {summary['int8_ms']:.1f}ms, "
+               f"加速 {summary['fp32_ms'] / summary['int8_ms'] if summary['int8_ms'] else 0:.2f}x, 报告: {report_path}")
+    Logger.log_info(message)
+    print(message)
+
+
+if __name__ == "__main__":
+    main()
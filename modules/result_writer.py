@@ -0,0 +1,121 @@
+import os
+import queue
+import threading
+import time
+import cv2
+from modules.logger import Logger
+from modules.config import global_config  # 引用全局配置对象
+
+
+class ResultWriter:
+    """后台结果图片写入线程, 检测流程只负责入队, 缩放及写盘不占用检测节拍.
+
+    队列有界: policy 为 drop 时队列满则丢弃本次写入, 为 block 时等待队列空出.
+    """
+
+    def __init__(self, queue_size=16, policy="drop"):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.policy = policy
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.write_time = 0.0
+        self.max_write_time = 0.0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ResultWriter", daemon=True)
+                self._thread.start()
+
+    def submit(self, save_path, img, size=None, frame=None):
+        """提交写入任务, size 不为空时在后台线程缩放后再写入; 返回是否入队成功.
+
+        frame 为 img 所在的图片缓冲区(PooledFrame)时, 由调用方先 retain, 写入完成或被丢弃后在此释放.
+        """
+        if not self._put(("image", save_path, img, size, frame), save_path):
+            if frame is not None:
+                frame.release()
+            return False
+        return True
+
+    def submit_files(self, files):
+        """提交原样写入的文件 [(路径, 字节数据), ...], 同一次检测的文件作为一个任务, 丢弃时一起丢弃."""
+        return self._put(("files", files, None), files[0][0])
+
+    def _put(self, job, save_path):
+        self._ensure_started()
+        try:
+            if self.policy == "block":
+                self.queue.put(job)
+            else:
+                self.queue.put_nowait(job)
+        except queue.Full:
+            self.dropped += 1
+            Logger.log_error(f"结果图片写入队列已满, 丢弃: {save_path}")
+            return False
+
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                start_time = time.perf_counter()
+                if job[0] == "files":
+                    for save_path, data in job[1]:
+                        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+                        with open(save_path, 'wb') as file:
+                            file.write(data)
+                else:
+                    _, save_path, img, size, _ = job
+                    os.makedirs(os.path.dirname(save_path), exist_ok=True)  # Ensure results directory exists
+                    if size is not None:
+                        img = cv2.resize(img, size)
+                    if not cv2.imwrite(save_path, img):
+                        Logger.log_error(f"结果图片保存失败: {save_path}")
+                elapsed = time.perf_counter() - start_time
+                self.written += 1
+                self.write_time += elapsed
+                self.max_write_time = max(self.max_write_time, elapsed)
+            except Exception as e:
+                Logger.log_error(f"结果图片保存失败: {str(e)}")
+            finally:
+                if job is not None and job[-1] is not None:
+                    job[-1].release()
+                self.queue.task_done()
+
+    def flush(self):
+        """等待队列中的图片全部写完."""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.join()
+
+    def close(self):
+        """写完队列中的图片后停止后台线程, 程序退出时调用."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self.queue.put(None)
+            thread.join()
+        Logger.log_info(f"结果图片写入: {self.stats()}")
+
+    def stats(self):
+        """队列深度、写入/丢弃数量及写入耗时."""
+        return {
+            "depth": self.queue.qsize(),
+            "max_depth": self.max_depth,
+            "written": self.written,
+            "dropped": self.dropped,
+            "avg_write_ms": self.write_time / self.written * 1000 if self.written else 0.0,
+            "max_write_ms": self.max_write_time * 1000,
+        }
+
+
+# 创建全局结果写入实例
+result_writer = ResultWriter(global_config.get_inference_settings()['writer_queue_size'],
+                             global_config.get_inference_settings()['writer_policy'])
@@ -0,0 +1,56 @@
+import os
+import threading
+from modules.logger import Logger
+
+
+class SettingWatcher:
+    """监视 setting.json, 文件变化时在后台重新校验并编译目标表, 由工作线程在两次检测之间取出替换.
+
+    后台线程不加载也不预热模型, 以免与检测同时使用同一模型; 模型在工作线程替换任务表时加载并预热.
+    """
+
+    def __init__(self, source, interval=1.0, validate=None):
+        self.source = source  # 最新一次成功加载的任务表, 下次变化时以它为基准比较模型配置
+        self.interval = interval
+        self.validate = validate  # 对新任务表的额外校验(如目标按相机的分配), 不合法时抛出异常
+        self._mtime = os.stat(source.config_path).st_mtime_ns
+        self._pending = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="SettingWatcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def take(self):
+        """取出已准备好的新任务表, 没有变化时返回 None."""
+        with self._lock:
+            staged, self._pending = self._pending, None
+        return staged
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                mtime = os.stat(self.source.config_path).st_mtime_ns
+            except OSError:
+                continue  # 编辑器保存时文件可能短暂不存在
+            if mtime == self._mtime:
+                continue
+
+            self._mtime = mtime
+            try:
+                staged = self.source.reload_targets(preload=False)
+                if self.validate is not None:
+                    self.validate(staged)
+            except Exception as e:
+                Logger.log_error(f"配置文件重新加载失败, 继续使用原配置: {str(e)}")
+                continue
+
+            self.source = staged
+            with self._lock:
+                self._pending = staged
+            Logger.log_info("配置文件已重新加载, 将在下一次检测前生效.")
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+from modules.logger import Logger
+from modules.frame_pool import FramePool, frame_pool  # 引用全局图片缓冲池
+
+
+class StreamGrabber:
+    """后台线程持续解码相机RTSP视频流, 在环形缓冲区中保留最近几帧, 拍照时直接取用, 无需等待相机编码JPEG.
+
+    断流或读取失败时按退避时间(1s 起, 最长 max_backoff)自动重连. 图片直接解码到取流线程自己的图片缓冲池, 移出环形缓冲区时释放.
+
+    缓冲池为 buffer_size 块环形缓冲区加 holders 块在外持有(检测、界面显示、后台保存)的图片, 多台相机取流时互不抢占,
+    也不占用拍照模式的全局缓冲池.
+    """
+
+    def __init__(self, url, buffer_size=4, max_backoff=10.0, holders=10):
+        self.url = url
+        self.max_backoff = max_backoff
+        self.buffer_size = max(buffer_size, 1)
+        self.pool = FramePool(self.buffer_size + holders, frame_pool.shape)
+        self.frames = deque()  # (PooledFrame, 解码完成时间)
+        self.reconnects = 0
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="StreamGrabber", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        with self._condition:
+            while self.frames:
+                self.frames.popleft()[0].release()
+
+    def _open(self):
+        capture = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # 尽量减少解码器内部缓存的旧帧
+        if not capture.isOpened():
+            capture.release()
+            return None
+        return capture
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            capture = self._open()
+            if capture is None:
+                Logger.log_error(f"视频流连接失败, {backoff:.0f}s 后重试: {self.url}")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            Logger.log_info(f"视频流已连接: {self.url}")
+            backoff = 1.0
+            while not self._stop_event.is_set():
+                # 先释放即将移出环形缓冲区的最旧一帧再取缓冲区, 解码中的一帧也计入 buffer_size
+                with self._condition:
+                    if len(self.frames) >= self.buffer_size:
+                        self.frames.popleft()[0].release()
+                frame = self.pool.acquire(self.pool.shape)
+                ok, img = capture.read(frame.array)
+                if not ok:
+                    frame.release()
+                    break
+                if img is not frame.array and not np.shares_memory(img, frame.array):
+                    # 视频流分辨率与缓冲区不同时 OpenCV 会另行分配图片
+                    frame.release()
+                    frame = self.pool.wrap(img)
+                with self._condition:
+                    self.frames.append((frame, time.time()))
+                    self._condition.notify_all()
+            capture.release()
+
+            if not self._stop_event.is_set():
+                self.reconnects += 1
+                Logger.log_error("视频流中断, 重新连接...")
+
+    def latest(self):
+        """最新一帧 (PooledFrame, 解码完成时间), 调用方用完后 release; 尚无图片时返回 (None, None)."""
+        with self._condition:
+            if not self.frames:
+                return None, None
+            frame, frame_time = self.frames[-1]
+            return frame.retain(), frame_time
+
+    def frame_after(self, after_time, timeout=5.0):
+        """等待并返回 after_time 之后解码完成的第一帧, 调用方用完后 release; 超时返回 (None, None)."""
+        deadline = time.time() + timeout
+        with self._condition:
+            while True:
+                for frame, frame_time in self.frames:
+                    if frame_time > after_time:
+                        return frame.retain(), frame_time
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None, None
+                self._condition.wait(remaining)
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+def validate_targets(targets):
+    """校验目标配置, 不合法时抛出 ValueError 并指明第几个目标."""
+    for index, target in enumerate(targets):
+        try:
+            if not isinstance(target["label"], str) or not target["label"]:
+                raise ValueError("label 不能为空")
+            x1, y1, x2, y2 = target["predefined_region"]
+            if not (x1 < x2 and y1 < y2) or min(x1, y1) < 0:
+                raise ValueError(f"predefined_region 坐标错误: {target['predefined_region']}")
+            for key in ("conf1", "conf2"):
+                if not 0 <= target[key] <= 1:
+                    raise ValueError(f"{key} 超出范围 0~1: {target[key]}")
+            if len(target["color"]) != 3 or not all(0 <= c <= 255 for c in target["color"]):
+                raise ValueError(f"color 错误: {target['color']}")
+            if "camera" in target and (not isinstance(target["camera"], str) or not target["camera"]):
+                raise ValueError(f"camera 错误: {target['camera']}")
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"第{index + 1}个目标配置错误: {e}") from e
+
+
+class TargetTable:
+    """加载时将目标配置编译为数组(区域、标签编号、conf1), 用广播运算完成检测框与全部目标的匹配判定."""
+
+    def __init__(self, targets):
+        self.targets = targets
+        self.label_ids = {label: index for index, label in enumerate(dict.fromkeys(t["label"] for t in targets))}
+        self.target_label_ids = np.array([self.label_ids[t["label"]] for t in targets], dtype=np.int64)
+        self.regions = np.array([t["predefined_region"] for t in targets], dtype=np.int64).reshape(-1, 4)
+        # 与检测置信度同为 float32, 与逐个比较 np.float32 置信度与 conf1 的结果一致
+        self.conf1 = np.array([t["conf1"] for t in targets], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.targets)
+
+    def classes(self, names):
+        """目标标签对应的模型类别编号, 用于推理时只保留相关类别."""
+        return [cls_id for cls_id, name in names.items() if name in self.label_ids]
+
+    def label_lut(self, names):
+        """按模型类别名称建立 类别编号 -> 目标标签编号 的查找表, 非目标类别为 -1."""
+        lut = np.full(max(names) + 1, -1, dtype=np.int64)
+        for cls_id, name in names.items():
+            lut[cls_id] = self.label_ids.get(name, -1)
+        return lut
+
+    def match(self, detections, lut):
+        """对每个目标选出标签一致且在预设区域内的最高置信度检测框, 同分时取最先出现的检测框;
+        置信度保留两位小数后不低于 conf1 为合格(passed).
+        """
+        found = np.zeros(len(self), dtype=bool)
+        passed = found
+        if len(detections):
+            det_label_ids = lut[detections["cls"].astype(np.int64)]
+            boxes = detections["box"]
+            confs = detections["conf"]
+
+            # (目标数, 检测数) 的匹配矩阵: 标签一致且检测框完全落在预设区域内
+            regions = self.regions[:, None, :]
+            mask = ((self.target_label_ids[:, None] == det_label_ids[None, :]) &
+                    (boxes[None, :, 0] >= regions[..., 0]) & (boxes[None, :, 1] >= regions[..., 1]) &
+                    (boxes[None, :, 2] <= regions[..., 2]) & (boxes[None, :, 3] <= regions[..., 3]))
+
+            found = mask.any(axis=1)
+            best = np.where(mask, confs[None, :], -np.inf).argmax(axis=1)  # 同分时取最先出现的检测框
+            best_conf = np.round(confs[best], 2)
+            passed = found & (best_conf >= self.conf1)
+
+        all_predictions = []
+        for index, target in enumerate(self.targets):
+            final_predictions = {
+                "label": target["label"],
+                "predict_conf": 0.00,
+                "boxes": np.array(target["predefined_region"]),
+                "color": [0, 0, 255],
+                "target_conf": target["conf1"],
+                "passed": False
+            }
+            if found[index]:
+                final_predictions["boxes"] = boxes[best[index]]
+                final_predictions["predict_conf"] = best_conf[index]
+                if passed[index]:
+                    final_predictions["color"] = target["color"]
+                    final_predictions["passed"] = True
+            all_predictions.append(final_predictions)
+        return all_predictions
@@ -0,0 +1,94 @@
+import json
+import threading
+from modules.logger import Logger
+from modules.model_registry import model_registry  # 引用全局模型缓存
+from modules.yolo_model import YoloModel
+
+
+class TaskTable:
+    """加载 setting.json 中的全部任务, 相同权重的模型经模型缓存在任务间共享; 换型只需切换当前任务指针.
+
+    只预加载当前任务的模型, 其余任务的模型在预加载或首次使用时经模型缓存加载, 常驻内存受缓存预算限制.
+    """
+
+    def __init__(self, config_path, active=None, tasks=None, preloading=None):
+        self.config_path = config_path
+        names = self.read_task_names(config_path)
+        active = active if active in names else names[0]
+        if tasks is None:
+            tasks = {name: YoloModel(config_path, name, preload=name == active) for name in names}
+        self.tasks = tasks
+        self.active = active
+        # 任务名 -> 后台预加载线程; 重新加载配置时由新任务表沿用, 换型时仍会等待之前开始的预加载
+        self._preloading = {} if preloading is None else preloading
+
+    @staticmethod
+    def read_task_names(config_path):
+        """读取配置文件中的全部任务名."""
+        with open(config_path) as f:
+            return [task.get("task_name", "") for task in json.load(f)]
+
+    @property
+    def model(self):
+        """当前任务的模型."""
+        return self.tasks[self.active]
+
+    def select(self, task_name):
+        """切换当前任务并返回其模型; 模型已预加载时仅切换指针, 否则在此加载并预热."""
+        if task_name not in self.tasks:
+            raise KeyError(f"任务 {task_name} 不存在")
+        if task_name != self.active:
+            preloading = self._preloading.pop(task_name, None)
+            if preloading is not None:
+                preloading.join()  # 预加载尚未完成时等待, 避免与检测同时使用同一模型
+            self.tasks[task_name].warmup()  # 已预热的模型直接跳过
+            Logger.log_info(f"换型: {self.active} -> {task_name}, 模型缓存: {model_registry.stats()}")
+            self.active = task_name
+        return self.model
+
+    def preload(self, task_name):
+        """PLC预告换型时在后台加载并预热下一任务的模型."""
+        if task_name not in self.tasks or task_name == self.active or task_name in self._preloading:
+            return
+        Logger.log_info(f"预加载任务 {task_name} 的模型")
+        thread = threading.Thread(target=self.tasks[task_name].warmup, name=f"Preload-{task_name}", daemon=True)
+        self._preloading[task_name] = thread
+        thread.start()
+
+    def task_for_recipe(self, recipe):
+        """按PLC配方号查找任务: 优先匹配任务配置中的 recipe, 否则按任务在配置文件中的顺序."""
+        for name, model in self.tasks.items():
+            if model.recipe == recipe:
+                return name
+        names = list(self.tasks)
+        return names[recipe] if 0 <= recipe < len(names) else None
+
+    def validate_cameras(self, cameras):
+        """校验目标按相机的分配: 任务中的目标配置了 "camera" 时, 每个目标都必须分配给检测该任务的某台相机,
+        且每台检测该任务的相机至少分配到一个目标; 不合法时抛出 ValueError."""
+        for name, model in self.tasks.items():
+            if not any("camera" in target for target in model.targets):
+                continue
+            # 绑定了该任务的相机, 以及未绑定任务(跟随当前任务)的相机
+            camera_names = [camera.name for camera in cameras if camera.task in (name, "")]
+            for index, target in enumerate(model.targets):
+                if target.get("camera") not in camera_names:
+                    raise ValueError(f"任务 {name} 第{index + 1}个目标的 camera 不是检测该任务的相机: "
+                                     f"{target.get('camera')}, 可用相机: {camera_names}")
+            for camera_name in camera_names:
+                if not model.camera_targets(camera_name):
+                    raise ValueError(f"任务 {name} 没有分配给相机 {camera_name or 'Camera'} 的目标")
+
+    def reload_targets(self, preload=True):
+        """重新读取全部任务配置, 已有任务复用已加载模型, 返回新的任务表.
+
+        preload=False 时只解析、校验并编译目标表, 不加载及预热模型(由调用方在工作线程中完成).
+        """
+        tasks = {}
+        for name in self.read_task_names(self.config_path):
+            warm = preload and name == self.active
+            if name in self.tasks:
+                tasks[name] = self.tasks[name].reload_targets(warm)
+            else:
+                tasks[name] = YoloModel(self.config_path, name, warm)
+        return TaskTable(self.config_path, self.active, tasks, self._preloading)
@@ -0,0 +1,93 @@
+import numpy as np
+from modules.inference_backend import ExportedModel, nms
+
+
+def plan_target_crops(regions, crop_size, padding, frame_shape):
+    """将预设检测区域聚类为少量固定尺寸的裁剪窗口, 返回窗口左上角坐标列表 [(x0, y0), ...].
+
+    每个区域外扩 padding 后必须完整落在某个窗口内, 否则抛出 ValueError; 窗口尺寸不超过画面时均为 crop_size, 便于按批推理.
+    """
+    frame_h, frame_w = frame_shape[:2]
+    crop_w, crop_h = min(crop_size, frame_w), min(crop_size, frame_h)
+
+    padded = np.asarray(regions, dtype=np.int64).reshape(-1, 4) + np.array([-padding, -padding, padding, padding])
+    padded[:, [0, 2]] = padded[:, [0, 2]].clip(0, frame_w)
+    padded[:, [1, 3]] = padded[:, [1, 3]].clip(0, frame_h)
+    for index, (x1, y1, x2, y2) in enumerate(padded):
+        if x2 - x1 > crop_w or y2 - y1 > crop_h:
+            raise ValueError(f"第{index + 1}个目标的预设区域外扩 {padding} 后为 {x2 - x1}x{y2 - y1}, "
+                             f"超过裁剪窗口 {crop_w}x{crop_h}, 请增大 crop_size 或改用 full/tiles 检测模式")
+
+    # 按从左到右的顺序贪心合并, 合并后外接框仍能放入一个窗口时归入同一簇
+    clusters = []
+    for box in padded[np.argsort(padded[:, 0], kind="stable")]:
+        for cluster in clusters:
+            union = np.concatenate([np.minimum(cluster[:2], box[:2]), np.maximum(cluster[2:], box[2:])])
+            if union[2] - union[0] <= crop_w and union[3] - union[1] <= crop_h:
+                cluster[:] = union
+                break
+        else:
+            clusters.append(box.copy())
+
+    # 窗口以簇外接框为中心, 并限制在画面范围内
+    origins = []
+    for x1, y1, x2, y2 in clusters:
+        x0 = int(min(max((x1 + x2 - crop_w) // 2, 0), frame_w - crop_w))
+        y0 = int(min(max((y1 + y2 - crop_h) // 2, 0), frame_h - crop_h))
+        origins.append((x0, y0))
+    return origins, (crop_w, crop_h)
+
+
+def crop_windows(img, origins, size):
+    """按窗口左上角坐标及尺寸从图像中裁剪子图(视图, 不复制)."""
+    crop_w, crop_h = size
+    return [img[y0:y0 + crop_h, x0:x0 + crop_w] for x0, y0 in origins]
+
+
+def offset_predictions(detections, x0, y0):
+    """将子图坐标下的检测结果数组平移回原图坐标."""
+    shifted = detections.copy()
+    shifted["box"] += np.array([x0, y0, x0, y0], dtype=np.float32)
+    return shifted
+
+
+def plan_tiles(frame_shape, tile_size, overlap):
+    """按模型输入尺寸及重叠比例将整帧切分为瓦片, 返回瓦片左上角坐标列表及瓦片尺寸."""
+    frame_h, frame_w = frame_shape[:2]
+    tile_w, tile_h = min(tile_size, frame_w), min(tile_size, frame_h)
+
+    def starts(length, tile):
+        stride = max(int(tile * (1 - overlap)), 1)
+        positions = list(range(0, length - tile + 1, stride))
+        if positions[-1] + tile < length:
+            positions.append(length - tile)  # 最后一块贴齐画面边缘
+        return positions
+
+    origins = [(x0, y0) for y0 in starts(frame_h, tile_h) for x0 in starts(frame_w, tile_w)]
+    return origins, (tile_w, tile_h)
+
+
+def merge_predictions(detections, iou_threshold):
+    """对来自相互重叠瓦片的检测结果按类别做NMS, 去除重复检测."""
+    if len(detections) == 0:
+        return detections
+
+    boxes = detections["box"] + (detections["cls"] * ExportedModel.max_wh)[:, None]
+    return detections[nms(boxes, detections["conf"], iou_threshold)]
+
+
+def plan_region_samples(regions, size, frame_shape):
+    """为每个预设区域预先计算 size x size 的最近邻采样坐标, 返回 (ys, xs), 形状均为 (区域数, size)."""
+    frame_h, frame_w = frame_shape[:2]
+    regions = np.asarray(regions, dtype=np.float32).reshape(-1, 4)
+    steps = (np.arange(size, dtype=np.float32) + 0.5) / size
+
+    xs = regions[:, [0]] + steps * (regions[:, [2]] - regions[:, [0]])
+    ys = regions[:, [1]] + steps * (regions[:, [3]] - regions[:, [1]])
+    return ys.astype(np.int64).clip(0, frame_h - 1), xs.astype(np.int64).clip(0, frame_w - 1)
+
+
+def sample_regions(img, samples):
+    """一次向量化索引裁剪并缩放所有区域, 返回形状为 (区域数, size, size, 3) 的图像批."""
+    ys, xs = samples
+    return img[ys[:, :, None], xs[:, None, :]]
@@ -1,10 +1,15 @@
 import time
-# import cv2
+import cv2
 from PySide6.QtCore import Signal, QObject, Slot
-from modules.camera import Camera
-from modules.yolo_model import YoloModel
+from modules.camera import CameraGroup
+from modules.task_table import TaskTable
 from modules.logger import Logger
 from modules.plc import PLC
+from modules.setting_watcher import SettingWatcher
+from modules.config import global_config
+from modules.model_registry import model_registry
+from modules.result_writer import result_writer
+from modules.frame_pool import frame_pool
 # import os
 
 class Worker(QObject):
@@ -14,14 +19,21 @@ class Worker(QObject):
     image_process = Signal(object)
     update_status = Signal(str)
     inference_result = Signal(str, list)
+    task_changed = Signal(str)
 
     def __init__(self):
         super().__init__()
-        self.camera = Camera()
+        self.cameras = CameraGroup()
+        self.camera = self.cameras.cameras[0]  # 单张拍照及检测使用第一台相机
         self.plc = None
         self.running = False
         self.current_frame = None, None
+        self.current_jpeg = None
+        self.tasks = None
         self.model = None
+        self.requested_task = None  # 界面选择的任务, 在两次检测之间生效
+        self.recipe = None
+        self.next_recipe = None
 
     @Slot()
     def start_capture(self):
@@ -36,8 +48,12 @@ class Worker(QObject):
         self.run.emit()
         frame, timestamp = self.camera.get_frame()
         if frame is not None:
-            self.current_frame = frame, timestamp
-            self.image_process.emit(frame)
+            if self.current_frame[0] is not None:
+                self.current_frame[0].release()
+            self.current_frame = frame, timestamp  # 缓冲区保留至下一次拍照, 供单张检测使用
+            self.current_jpeg = self.camera.last_jpeg
+            self.image_process.emit(frame.retain())  # 界面显示后释放
+            self.camera.save_frame(frame, timestamp)
             self.update_status.emit("")
             Logger.log_message("采集图片成功")
         else:
@@ -54,17 +70,18 @@ class Worker(QObject):
         self.inference_result.emit("", [])
         self.run.emit()
 
-        self.model = YoloModel("config/setting.json")
+        self.load_tasks()
+        self.select_task()
 
         # 对最近一次拍照的照片进行推理
         frame, timestamp = self.current_frame
 
         # 以下为测试使用
-        # frame = cv2.imread("images/20241231_150322.jpg")
+        # frame = FramePool.wrap(cv2.imread("images/20241231_150322.jpg"))
         # timestamp = "20241231_150322"
 
         if frame is not None:
-            predictions, processed_img, result = self.model.predict(frame, timestamp)
+            predictions, processed_img, result = self.model.predict(frame.array, timestamp, self.current_jpeg)
             self.image_process.emit(processed_img)
             self.inference_result.emit("OK" if result else "NG", predictions)
             self.update_status.emit("图像检测完成！")
@@ -81,8 +98,22 @@ class Worker(QObject):
         self.run.emit()
         self.running = True
 
+        if inference:
+            # 模型加载并预热完成后才开始响应PLC触发
+            self.update_status.emit("模型加载中...")
+            self.load_tasks()
+            self.warmup_camera_tasks()
+            self.update_status.emit("自动运行检测中...")
+            watcher = SettingWatcher(self.tasks, global_config.get_inference_settings()['reload_interval'],
+                                     lambda tasks: tasks.validate_cameras(self.cameras.cameras))
+            watcher.start()
+        else:
+            self.model = None
+            watcher = None
+
         self.plc = PLC()
-        self.model = YoloModel("config/setting.json") if inference else None
+        if inference:
+            self.plc.write_ready(self.model.ready)
         trigger_memory = False
 
         # 以下为测试数据
@@ -96,38 +127,93 @@ class Worker(QObject):
         #         fake_data.append({'frame': img_path, 'timestamp': filename})
 
         while self.running:
+            # 配置文件修改后, 在两次检测之间替换为新编译的任务表
+            staged = watcher.take() if watcher else None
+            if staged is not None:
+                if self.tasks.active in staged.tasks:
+                    staged.select(self.tasks.active)
+                self.tasks = staged
+                self.pin_models()
+                self.tasks.model.warmup()  # 在工作线程加载并预热, 模型路径及权重未变时直接复用
+                self.warmup_camera_tasks()
+
             read_bits = self.plc.read_bits()
             trigger = False
             if read_bits is not None:
                 trigger = read_bits[self.plc.trigger_bit]
 
+            if inference and not trigger_memory:
+                self.select_task(read_bits)
+
             if trigger and not trigger_memory:
                 self.image_process.emit(None)
                 self.inference_result.emit("", [])
-                frame, timestamp = self.camera.get_frame()
+                trigger_time = time.time()
+                # 所有相机同时拍照; 启用 roi_decode 的相机只解码目标区域用于检测, 界面显示缩小解码的预览图
+                rois = [self.camera_model(camera).roi(self.camera_model(camera).camera_targets(camera.name))
+                        for camera in self.cameras.cameras] \
+                    if inference else None
+                captures = self.cameras.capture(rois)
 
                 # 以下为测试数据
-                # frame = cv2.imread(fake_data[fake_index].get('frame'))
-                # timestamp = fake_data[fake_index].get('timestamp')
+                # frame = FramePool.wrap(cv2.imread(fake_data[fake_index].get('frame')))
+                # captures = [(self.camera.decoder.views_from_frame(frame, None, 1), fake_data[fake_index].get('timestamp'))]
                 # fake_index += 1
                 # if fake_index >= len(fake_data):
                 #     fake_index = 0
 
-                if frame is not None:
+                if all(views is not None for views, _ in captures):
                     Logger.log_message("采集图片成功" + (",开始检测..." if inference else ""))
-                    self.image_process.emit(frame)
+                    if len(captures) == 1:
+                        self.image_process.emit(captures[0][0]["preview_frame"].retain())  # 界面显示后释放
 
                     if inference:
-                        predictions, processed_img, result = self.model.predict(frame, timestamp)
-                        self.image_process.emit(processed_img)
-                        self.inference_result.emit("OK" if result else "NG", predictions)
+                        capture_time = time.time()
+                        # 各相机分别判定, 全部OK才输出OK; 判定完成后立即输出PLC结果, 画框及保存图片放在之后
+                        judged = []
+                        for camera, (views, timestamp) in zip(self.cameras.cameras, captures):
+                            model = self.camera_model(camera)
+                            predictions, camera_result = model.judge(views["roi"], views["offset"],
+                                                                     model.camera_targets(camera.name))
+                            judged.append((camera, model, views, timestamp, predictions, camera_result))
+                        result = all(item[5] for item in judged)
                         self.plc.write_bit(self.plc.result_ok_bit, result)
                         self.plc.write_bit(self.plc.result_ng_bit, not result)
+                        verdict_time = time.time()
+
+                        processed_imgs = []
+                        all_predictions = []
+                        for camera, model, views, timestamp, predictions, camera_result in judged:
+                            processed_imgs.append(model.render(views["preview"], predictions, camera_result,
+                                                               camera.file_stem(timestamp), camera.last_jpeg,
+                                                               views["shape"]))
+                            all_predictions.extend(predictions)
+                        self.image_process.emit(processed_imgs[0] if len(processed_imgs) == 1
+                                                else cv2.hconcat(processed_imgs))
+                        self.inference_result.emit("OK" if result else "NG", all_predictions)
+                        Logger.log_info(f"触发到输出结果: {verdict_time - trigger_time:.3f}s "
+                                        f"(拍照 {len(captures)} 台相机 {capture_time - trigger_time:.3f}s, "
+                                        f"判定 {verdict_time - capture_time:.3f}s), "
+                                        f"画框及显示: {time.time() - verdict_time:.3f}s, "
+                                        f"图片缓冲区占用: {frame_pool.stats()['in_use']}/{frame_pool.stats()['size']}")
+                    elif len(captures) > 1:
+                        self.image_process.emit(cv2.hconcat([cv2.resize(views["preview"], (1280, 720))
+                                                             for views, _ in captures]))
+
+                    # 视频流图片在输出判定结果之后才交给后台编码保存
+                    for camera, (views, timestamp) in zip(self.cameras.cameras, captures):
+                        if "frame" in views:
+                            camera.save_frame(views["frame"], timestamp)
 
                     trigger_memory = True
                 else:
                     self.error.emit("拍照失败！")
 
+                for views, _ in captures:
+                    if views is not None:
+                        for used in views["frames"]:
+                            used.release()  # 检测及保存已不再引用原图, 归还缓冲区
+
             if not trigger and trigger_memory:
                 trigger_memory = False
                 if inference:
@@ -135,9 +221,83 @@ class Worker(QObject):
                     self.plc.write_bit(self.plc.result_ng_bit, False)
 
             time.sleep(self.plc.interval)
+
+        if inference:
+            watcher.stop()
+            self.plc.write_ready(False)
+            Logger.log_info(f"模型缓存: {model_registry.stats()}")
+            result_writer.flush()
+            Logger.log_info(f"结果图片写入: {result_writer.stats()}")
+        Logger.log_info(f"图片缓冲区: {frame_pool.stats()}")
+        for camera in self.cameras.cameras:
+            if camera.grabber is not None:
+                Logger.log_info(f"相机{camera.name}取流图片缓冲区: {camera.grabber.pool.stats()}")
+            if camera.stats():
+                Logger.log_info(f"相机{camera.name}拍照延迟: {camera.stats()}")
         self.update_status.emit("")
         self.cleanup()
 
+    def load_tasks(self):
+        """加载全部任务; 已加载时重新读取配置并复用已加载的模型."""
+        if self.tasks is None:
+            self.tasks = TaskTable("config/setting.json")
+        else:
+            self.tasks = self.tasks.reload_targets()
+        self.tasks.validate_cameras(self.cameras.cameras)
+        self.model = self.tasks.model
+        self.pin_models()
+
+    def pin_models(self):
+        """当前任务及相机绑定任务的模型不被模型缓存淘汰, 预加载下一任务时不会释放正在使用的模型."""
+        models = [self.tasks.model] + [self.tasks.tasks[camera.task] for camera in self.cameras.cameras
+                                       if camera.task in self.tasks.tasks]
+        model_registry.pin(key for model in models for key in model.model_keys())
+
+    def camera_model(self, camera):
+        """相机检测所用任务的模型: 相机配置了 task 时为该任务, 否则为当前任务."""
+        return self.tasks.tasks.get(camera.task, self.model) if camera.task else self.model
+
+    def warmup_camera_tasks(self):
+        """加载并预热各相机绑定的任务模型, 使其与当前任务一样在首次触发前就绪."""
+        for camera in self.cameras.cameras:
+            if not camera.task:
+                continue
+            if camera.task not in self.tasks.tasks:
+                Logger.log_error(f"相机 {camera.name} 的任务 {camera.task} 不存在, 使用当前任务")
+                continue
+            self.tasks.tasks[camera.task].warmup()
+
+    def request_task(self, task_name):
+        """界面选择任务, 可在任意线程调用, 由工作线程在两次检测之间切换."""
+        self.requested_task = task_name
+
+    def select_task(self, read_bits=None):
+        """按PLC配方位或界面选择切换当前任务, 换型仅切换任务指针."""
+        task_name, self.requested_task = self.requested_task, None
+        if read_bits is not None and self.plc is not None and self.plc.recipe_bits:
+            recipe = self.plc.read_recipe(read_bits)
+            if recipe != self.recipe:
+                self.recipe = recipe
+                task_name = self.tasks.task_for_recipe(recipe)
+                if task_name is None:
+                    Logger.log_error(f"配方号 {recipe} 没有对应的任务")
+
+        # PLC预告下一配方时, 在后台预加载其模型, 换型时无需等待加载
+        if read_bits is not None and self.plc is not None and self.plc.next_recipe_bits:
+            next_recipe = self.plc.read_recipe(read_bits, self.plc.next_recipe_bits)
+            if next_recipe != self.next_recipe:
+                self.next_recipe = next_recipe
+                next_task = self.tasks.task_for_recipe(next_recipe)
+                if next_task is not None:
+                    self.tasks.preload(next_task)
+
+        if task_name is not None and task_name in self.tasks.tasks:
+            self.tasks.select(task_name)
+        if self.model is not self.tasks.model:
+            self.model = self.tasks.model
+            self.pin_models()
+            self.task_changed.emit(self.tasks.active)
+
     @Slot()
     def start_continuous_capture(self):
         self._run_continuous_capture_or_inference(inference=False)
@@ -1,27 +1,51 @@
 import json
 import os
 import time
+import weakref
 import cv2
 import numpy as np
+import torch
 from ultralytics import YOLO
 from modules.logger import Logger
 from modules.config import global_config  # 引用全局配置对象
+from modules.model_registry import model_registry  # 引用全局模型缓存
+from modules.result_writer import result_writer  # 引用全局结果写入
+from modules.annotation import annotation_renderer, encode_sidecar
+from modules.inference_backend import OnnxModel, OpenVinoModel, as_detections, letterbox
+from modules.target_table import TargetTable, validate_targets
+from modules.tiling import (crop_windows, merge_predictions, offset_predictions, plan_region_samples,
+                            plan_target_crops, plan_tiles, sample_regions)
 
 
 class YoloModel:
-    def __init__(self, config_path):
-        self.load_config(config_path)
-        self.models = []
+    def __init__(self, config_path, task_name=None, preload=True):
+        self.load_config(config_path, task_name)
+        self.models = []  # 模型加载方式 (path, loader, tag, conf, backend), 模型实例由模型缓存持有
+        self.ready = False
+        self._second_stage_batch = None  # 二次检测批量输入缓冲区, 按候选数量按需扩容
+        self._classify_batch = None  # 区域分类的 NCHW float32 输入张量缓冲区
         self.load_models()
+        self.plan_detection()
+        if preload:
+            self.warmup()
 
-    def load_config(self, config_path):
-        """从JSON文件读取配置文件."""
+    def load_config(self, config_path, task_name=None):
+        """从JSON文件读取配置文件, 未指定任务名时使用第一个任务."""
         try:
+            self.config_path = config_path
             with open(config_path) as f:
                 config = json.load(f)
-                self.task_name = config[0].get("task_name", "")
-                self.model_configs = config[0].get("model", [])
-                self.targets = config[0].get("targets", [])
+                task = config[0] if task_name is None else next(
+                    (task for task in config if task.get("task_name") == task_name), None)
+                if task is None:
+                    raise ValueError(f"任务 {task_name} 不存在")
+                self.task_name = task.get("task_name", "")
+                self.recipe = task.get("recipe")  # PLC配方号, 未配置时按任务顺序
+                self.model_configs = task.get("model", [])
+                self.targets = task.get("targets", [])
+                self.second_stage = task.get("second_stage", False)  # 是否启用二次模型检测
+                validate_targets(self.targets)
+                self.target_table = TargetTable(self.targets)
                 Logger.log_info("成功加载配置文件.")
         except FileNotFoundError:
             Logger.log_error("配置文件未找到.")
@@ -34,136 +58,344 @@ class YoloModel:
             raise
 
     def load_models(self):
-        """从配置文件加载模型配置."""
+        """从配置文件读取模型配置, 模型在首次使用时经模型缓存加载."""
         try:
             for model_config in self.model_configs:
                 model_path = model_config.get("path", "")
-                if model_path:
-                    self.models.append(
-                        (YOLO(model_path), model_config.get("conf", 0.2)))  # Store model and confidence threshold
-                else:
+                backend = model_config.get("backend", "torch")
+                if not model_path:
                     Logger.log_info("模型路径错误.")
-            Logger.log_info("成功加载模型.")
+                elif backend == "openvino":
+                    self.models.append((model_path, *self.openvino_model(model_config), model_config.get("conf", 0.2), backend))
+                elif backend == "onnx":
+                    self.models.append((model_path, *self.onnx_model(model_config), model_config.get("conf", 0.2), backend))
+                elif backend == "torch":
+                    self.models.append((model_path, YOLO, "torch", model_config.get("conf", 0.2), backend))  # Store model and confidence threshold
+                else:
+                    raise ValueError(f"不支持的推理后端: {backend}")
+            self.label_luts = [None] * len(self.models)
+            self.model_classes = [None] * len(self.models)
+            self._bound_models = [None] * len(self.models)
         except Exception as e:
             Logger.log_error(f"加载模型错误: {str(e)}")
             raise
 
-    def openvino_model(self, img):
-        pass
+    def get_model(self, index):
+        """取得已绑定的模型; 尚未绑定或已被模型缓存淘汰时经模型缓存取得并绑定."""
+        bound = self._bound_models[index]
+        model = bound() if bound is not None else None
+        if model is None:
+            model = self.bind_model(index)
+        path, _, tag, conf, backend = self.models[index]
+        model_registry.touch(model_registry.key(path, tag))  # 按实际使用更新最近使用顺序
+        return model, conf, backend
+
+    def model_keys(self):
+        """本任务所用模型在模型缓存中的 key."""
+        return [model_registry.key(path, tag) for path, _, tag, _, _ in self.models]
+
+    def bind_model(self, index):
+        """经模型缓存取得模型(未加载、已被淘汰或权重文件变化时加载), 并确保目标查找表与该模型的类别一致.
+
+        在选择任务时(warmup)调用, 检测过程中 get_model 直接使用已绑定的模型, 不再查询模型缓存.
+        """
+        path, loader, tag, _, _ = self.models[index]
+        model = model_registry.get(path, loader, tag)
+        bound = self._bound_models[index]
+        if bound is None or bound() is not model:
+            self.label_luts[index] = self.target_table.label_lut(model.names)
+            self.model_classes[index] = self.target_table.classes(model.names)
+            self._bound_models[index] = weakref.ref(model)  # 弱引用, 不妨碍模型缓存释放模型
+        return model
+
+    def reload_targets(self, preload=True):
+        """重新读取并校验当前任务配置, 返回编译好目标表的新 YoloModel, 由调用方在两次检测之间替换.
+
+        已加载的模型仍由模型缓存持有, 仅模型路径等变化时才加载新权重.
+        """
+        return YoloModel(self.config_path, self.task_name, preload)
+
+    def plan_detection(self):
+        """按第一个模型的检测模式(mode)规划整图推理方式.
+
+        full: 整图推理;
+        crops: 将预设区域聚类为少量裁剪窗口, 按批推理后映射回原图坐标;
+        tiles: 将整帧切分为相互重叠的瓦片, 按批推理后映射回原图坐标并跨瓦片NMS合并;
+        classify: 不做检测, 将所有预设区域裁剪缩放为一批, 由分类模型判断区域内是否为目标标签.
+        """
+        model_config = self.model_configs[0] if self.model_configs else {}
+        self.detect_mode = model_config.get("mode", "full")
+        self.crop_size = model_config.get("crop_size", 640)
+        self.crop_padding = model_config.get("crop_padding", 32)
+        self.tile_size = model_config.get("tile_size", 640)
+        self.tile_overlap = model_config.get("tile_overlap", 0.2)
+        self.tile_iou = model_config.get("tile_iou", 0.5)
+        self.batch_size = model_config.get("batch_size", 8)
+        self.classify_size = model_config.get("imgsz", 224)
+        self.roi_padding = max(model_config.get("roi_padding", 32), self.crop_padding)
+        self.window_plan = None
+        self.region_samples = None
+        self.second_stage_size = self.model_configs[1].get("imgsz", 160) if len(self.model_configs) > 1 else 160
+        if self.second_stage and len(self.models) < 2:
+            raise ValueError("启用二次检测需配置第二个模型")
 
-    def predict(self, img, timestamp=None):
-        """对输入图片进行预测."""
+        inference_settings = global_config.get_inference_settings()
+        frame_shape = (inference_settings['frame_height'], inference_settings['frame_width'])
+        if self.detect_mode in ("crops", "tiles"):
+            self.plan_windows(frame_shape)
+        elif self.detect_mode == "classify":
+            if self.models[0][4] != "torch":
+                raise ValueError("分类判定模式仅支持torch后端")
+            self.plan_region_samples(frame_shape)
+        elif self.detect_mode != "full":
+            raise ValueError(f"不支持的检测模式: {self.detect_mode}")
+
+    def camera_targets(self, camera_name):
+        """相机负责判定的目标序号: 目标配置了 "camera" 时为该相机名称的目标; 任务未按相机分配目标时为 None(全部目标)."""
+        if not any("camera" in target for target in self.targets):
+            return None
+        return [index for index, target in enumerate(self.targets) if target.get("camera") == camera_name]
+
+    def roi(self, indices=None):
+        """所有预设区域(indices 不为 None 时只取这些序号的目标)的外接框(外扩 roi_padding), 只解码该范围即可完成检测."""
+        targets = self.targets if indices is None else [self.targets[index] for index in indices]
+        if not targets:
+            return None
+        regions = np.asarray([target["predefined_region"] for target in targets], dtype=np.int64)
+        x1, y1 = regions[:, :2].min(axis=0) - self.roi_padding
+        x2, y2 = regions[:, 2:].max(axis=0) + self.roi_padding
+        return max(int(x1), 0), max(int(y1), 0), int(x2), int(y2)
+
+    def regions_at(self, offset):
+        """预设区域在左上角位于原图 offset 处的区域图中的坐标."""
+        ox, oy = offset
+        return [[x1 - ox, y1 - oy, x2 - ox, y2 - oy] for x1, y1, x2, y2 in
+                (target["predefined_region"] for target in self.targets)]
+
+    def plan_windows(self, frame_shape, offset=(0, 0)):
+        """按画面尺寸规划裁剪窗口或瓦片, 结果按画面尺寸及区域图位置缓存."""
+        if self.detect_mode == "crops":
+            origins, size = plan_target_crops(self.regions_at(offset), self.crop_size, self.crop_padding, frame_shape)
+        else:
+            origins, size = plan_tiles(frame_shape, self.tile_size, self.tile_overlap)
+        self.window_plan = ((tuple(frame_shape[:2]), tuple(offset)), origins, size)
+        Logger.log_info(f"检测窗口({self.detect_mode}) {len(origins)} 个, 尺寸 {size[0]}x{size[1]}.")
+
+    def plan_region_samples(self, frame_shape, offset=(0, 0)):
+        """按画面尺寸预先计算所有预设区域的采样坐标, 结果按画面尺寸及区域图位置缓存."""
+        self.region_samples = ((tuple(frame_shape[:2]), tuple(offset)),
+                               plan_region_samples(self.regions_at(offset), self.classify_size, frame_shape))
+
+    def classify_regions(self, img, offset=(0, 0)):
+        """将所有预设区域裁剪为一批并分类, 按目标标签的分类概率生成与检测判定相同格式的结果."""
+        if self.region_samples is None or self.region_samples[0] != (img.shape[:2], tuple(offset)):
+            self.plan_region_samples(img.shape, offset)
+        batch = sample_regions(img, self.region_samples[1])
+        if self._classify_batch is None or self._classify_batch.shape[0] != len(batch):
+            self._classify_batch = np.empty((len(batch), 3, self.classify_size, self.classify_size), dtype=np.float32)
+        # BGR -> RGB, NHWC -> NCHW 并归一化, 直接作为一个输入张量, 不再逐张经 ultralytics 前处理
+        np.multiply(batch[..., ::-1].transpose(0, 3, 1, 2), 1 / 255.0, out=self._classify_batch, casting="unsafe")
+
+        model, _, _ = self.get_model(0)
+        results = model.predict(torch.from_numpy(self._classify_batch), imgsz=self.classify_size)
+        probs = np.stack([result.probs.data.cpu().numpy() for result in results])
+        class_ids = {name: index for index, name in model.names.items()}
+
+        all_predictions = []
+        for target, prob in zip(self.targets, probs):
+            label_id = class_ids.get(target["label"])
+            predict_conf = round(float(prob[label_id]), 2) if label_id is not None else 0.00
+            passed = predict_conf >= target["conf1"]
+            all_predictions.append({
+                "label": target["label"],
+                "predict_conf": predict_conf,
+                "boxes": np.array(target["predefined_region"]),
+                "color": target["color"] if passed else [0, 0, 255],
+                "target_conf": target["conf1"],
+                "passed": passed
+            })
+        return all_predictions
+
+    def detect(self, img, offset=(0, 0)):
+        """对整帧(或左上角位于原图 offset 处的区域图)执行第一个模型的检测, 返回原图坐标下的结构化检测结果数组."""
+        ox, oy = offset
+        if self.detect_mode == "full":
+            prediction_result = self.run_model(0, img)
+            return offset_predictions(prediction_result, ox, oy) if ox or oy else prediction_result
+
+        if self.window_plan is None or self.window_plan[0] != (img.shape[:2], tuple(offset)):
+            self.plan_windows(img.shape, offset)
+        _, origins, size = self.window_plan
+        windows = crop_windows(img, origins, size)
+        batch_size = len(windows) if self.detect_mode == "crops" else max(self.batch_size, 1)
+
+        window_results = []
+        for start in range(0, len(windows), batch_size):
+            batch_result = self.run_model_batch(0, windows[start:start + batch_size])
+            for (x0, y0), result in zip(origins[start:start + batch_size], batch_result):
+                window_results.append(offset_predictions(result, x0 + ox, y0 + oy))
+        if not window_results:
+            return as_detections(np.empty((0, 6), dtype=np.float32))
+        prediction_result = np.concatenate(window_results)
+
+        if self.detect_mode == "tiles":
+            prediction_result = merge_predictions(prediction_result, self.tile_iou)
+        return prediction_result
+
+    def warmup(self):
+        """用相机分辨率的合成图片预热模型, 使首次触发无需承担延迟初始化开销."""
+        inference_settings = global_config.get_inference_settings()
+        runs = inference_settings['warmup_runs']
+        frame = np.full((inference_settings['frame_height'], inference_settings['frame_width'], 3), 114, dtype=np.uint8)
+
+        for index in range(len(self.models)):
+            model = self.bind_model(index)
+            backend = self.models[index][4]
+            if runs <= 0 or model_registry.is_warm(model):
+                continue
+
+            timings = []
+            for _ in range(runs):
+                start_time = time.perf_counter()
+                if index == 0 and self.detect_mode == "classify":
+                    self.classify_regions(frame)
+                elif index == 0:
+                    self.detect(frame)  # 第一个模型按检测模式(整图/裁剪)预热
+                else:
+                    self.run_model(index, frame)
+                timings.append(time.perf_counter() - start_time)
+            model_registry.mark_warm(model)
+            Logger.log_info(f"模型{index}({backend})预热完成, 耗时: {', '.join(f'{t * 1000:.0f}ms' for t in timings)}")
+
+        self.ready = True
+        Logger.log_info("模型就绪.")
+
+    def openvino_model(self, model_config):
+        """OpenVINO推理后端的加载方式及缓存标签, streams为CPU并行推理流数."""
+        streams = model_config.get("streams", 1)
+        threads = model_config.get("threads", 0)
+        imgsz = model_config.get("imgsz", 640)
+        return (lambda path: OpenVinoModel.from_weights(path, streams=streams, threads=threads, imgsz=imgsz),
+                f"openvino:{streams}:{threads}:{imgsz}")
+
+    def onnx_model(self, model_config):
+        """ONNX Runtime推理后端的加载方式及缓存标签."""
+        threads = model_config.get("threads", 0)
+        imgsz = model_config.get("imgsz", 640)
+        precision = model_config.get("precision", "fp32")
+        return (lambda path: OnnxModel.from_weights(path, threads=threads, imgsz=imgsz, precision=precision),
+                f"onnx:{threads}:{imgsz}:{precision}")
+
+    def run_model(self, index, img):
+        """按模型后端执行推理, 只保留目标相关类别, 统一返回结构化检测结果数组."""
+        model, conf, backend = self.get_model(index)
+        classes = self.model_classes[index]
+        if backend == "torch":
+            return self.extract_prediction_result(model.predict(img, conf=conf, classes=classes)[0])
+        return model.predict(img, conf, classes)
+
+    def run_model_batch(self, index, imgs):
+        """对一批图片执行推理, 返回每张图片的检测结果数组列表."""
+        model, conf, backend = self.get_model(index)
+        classes = self.model_classes[index]
+        if backend == "torch":
+            return [self.extract_prediction_result(result) for result in model.predict(imgs, conf=conf, classes=classes)]
+        return model.predict_batch(imgs, conf, classes)
+
+    def predict(self, img, timestamp=None, jpeg=None):
+        """对输入图片进行预测, 判定后画检测框并保存图片."""
         if img is None:
             Logger.log_error("No image provided for prediction.")
             return []
 
-        start_time = time.time()
-        Logger.log_message(f"模型预测开始...")
-        result = self.models[0][0].predict(img, conf=self.models[0][1])[0]  # Run the first model prediction
-        Logger.log_message("模型预测完成")
-        prediction_result = self.extract_prediction_result(result)
-
-        Logger.log_message("检测判定开始...")
-        all_predictions = []  # 保存所有目标的预测结果
+        all_predictions, result_ready = self.judge(img)
+        process_img = self.render(img, all_predictions, result_ready, timestamp, jpeg)
+        return all_predictions, process_img, result_ready
 
-        # 遍历每个目标进行预测
-        for target in self.targets:
-            target_predictions = self.process_target(prediction_result, target, img)
-            all_predictions.append(target_predictions)
+    def judge(self, img, offset=(0, 0), indices=None):
+        """只做目标判定, 返回所有目标的预测结果及是否OK; 画框及保存由 render 另行完成.
 
-        Logger.log_message("检测判定完成")
-        process_img, result_ready = self.draw_judge_results(img, all_predictions, timestamp)
+        img 可为只解码了目标区域的区域图, offset 为其左上角在原图中的坐标, 预测结果均为原图坐标;
+        indices 不为 None 时只判定这些序号的目标(多相机时每台相机只拍到部分目标, 见 camera_targets).
+        """
+        start_time = time.time()
+        if self.detect_mode == "classify":
+            Logger.log_message("区域分类判定开始...")
+            all_predictions = self.classify_regions(img, offset)
+            Logger.log_message("区域分类判定完成")
+        else:
+            Logger.log_message(f"模型预测开始...")
+            prediction_result = self.detect(img, offset)  # Run the first model prediction
+            Logger.log_message("模型预测完成")
+
+            Logger.log_message("检测判定开始...")
+            all_predictions = self.target_table.match(prediction_result, self.label_luts[0])  # 保存所有目标的预测结果
+
+            if self.second_stage:
+                self.verify_second_stage(img, all_predictions, offset)
+
+            Logger.log_message("检测判定完成")
+        if indices is not None:
+            all_predictions = [all_predictions[index] for index in indices]
+        # 分配给相机的目标为空时不能判为OK, 加载配置时已由 TaskTable.validate_cameras 拒绝
+        result_ready = bool(all_predictions or indices is None) and all(prediction["passed"] for prediction in all_predictions)
 
         Logger.log_info(f"检测时间: {time.time() - start_time:.2f}s")
-        return all_predictions, process_img, result_ready
-
-    def process_target(self, prediction_result, target, orig_img):
-        """对每个目标遍历进行二次模型预测."""
-        conf1 = target["conf1"]
-        conf2 = target["conf2"]
-        target_label = target["label"]
-        color = target['color']
-        predefined_region = np.array(target["predefined_region"])
-        # morphology = target.get("morphology")
-
-        final_predictions = {
-            "label": target_label,
-            "predict_conf": 0.00,
-            "boxes": predefined_region,
-            "color": [0, 0, 255],
-            "target_conf": conf1
-        }
-
-        # 刷选出与目标标签一致，且在预设坐标范围，置信度大于预设值的第一次预测结果
-        filtered_boxes = []
-
-        for cls_name, box, conf in prediction_result:
-            if cls_name == target_label and self.is_in_region(box, predefined_region):
-                filtered_boxes.append((box, conf))
-
-        if filtered_boxes:
-            candidate_box = max(filtered_boxes, key=lambda x: x[1])
-            final_predictions["boxes"] = candidate_box[0]
-            final_predictions["predict_conf"] = round(candidate_box[1], 2)
-
-            if final_predictions["predict_conf"] >= final_predictions["target_conf"]:
-                final_predictions["color"] = color
-
-            # 用形态学对检测结果进行二次检测（如检测圆度、直径等）
-            # if morphology is not None:
-            #     self.morphology_detect(orig_img, candidate_box[0], morphology, target_label)
-
-        # 对符合条件的第一次预测结果进行二次模型检测
-        # if filtered_boxes:
-        #     candidate_box = max(filtered_boxes, key=lambda x: x[1])
-        #     second_stage_conf_predict = self.crop_and_predict(orig_img, candidate_box[0], target_label)
-        #     final_predictions["predict_conf"] = second_stage_conf_predict
-        #
-        #     if second_stage_conf_predict > conf2:
-        #         final_predictions["boxes"] = candidate_box[0]
-        #         final_predictions["color"] = color
-        # print(final_predictions)
-        return final_predictions
+        return all_predictions, result_ready
 
     def extract_prediction_result(self, result):
-        """打包预测结果，转换为类别名称、框、置信度的元组列表."""
-        cls = result.boxes.cls.cpu().numpy()
-        boxes = result.boxes.xyxy.cpu().numpy()
-        conf = result.boxes.conf.cpu().numpy()
-        names = result.names
-
-        return [(names[int(x)], y, z) for x, y, z in zip(cls, boxes, conf)]
-
-    def is_in_region(self, box, region):
-        """检查检测框是否在预设范围."""
-        return (
-                box[0] >= region[0] and box[1] >= region[1] and
-                box[2] <= region[2] and box[3] <= region[3]
-        )
-
-    def crop_and_predict(self, orig_img, box, target_label):
-        """按照第一次预测结果框裁剪图像，并进行二次模型检测"""
-        x1, y1, x2, y2 = box.astype(int)
+        """打包预测结果, (x1, y1, x2, y2, conf, cls) 一次拷贝到CPU并转换为结构化检测结果数组."""
+        return as_detections(result.boxes.data.cpu().numpy())
+
+    def crop_and_predict(self, orig_img, candidates, offset=(0, 0)):
+        """按照第一次预测结果框裁剪图像, letterbox为同一尺寸后一次批量进行二次模型检测.
+
+        candidates 为 [(候选框, 目标标签), ...], 候选框为原图坐标, orig_img 左上角位于原图 offset 处;
+        返回每个候选框对应标签的最高二次检测置信度.
+        """
         padding = 20
+        size = self.second_stage_size
+        if self._second_stage_batch is None or len(self._second_stage_batch) < len(candidates):
+            self._second_stage_batch = np.empty((len(candidates), size, size, 3), dtype=np.uint8)
+        batch = self._second_stage_batch[:len(candidates)]
 
-        # 确保增加后的边界框不会超出图像尺寸
-        x1, y1 = max(x1 - padding, 0), max(y1 - padding, 0)
-        x2, y2 = min(x2 + padding, orig_img.shape[1] - 1), min(y2 + padding, orig_img.shape[0] - 1)
+        for index, (box, _) in enumerate(candidates):
+            x1, y1, x2, y2 = box.astype(int) - np.array([offset[0], offset[1], offset[0], offset[1]])
 
-        cropped_img = orig_img[y1:y2, x1:x2]
-        if cropped_img.size == 0:
-            return 0
+            # 确保增加后的边界框不会超出图像尺寸
+            x1, y1 = max(x1 - padding, 0), max(y1 - padding, 0)
+            x2, y2 = min(x2 + padding, orig_img.shape[1] - 1), min(y2 + padding, orig_img.shape[0] - 1)
 
-        try:
-            # 用二次模型对裁减图片进行预测
-            result = self.models[1][0].predict(cropped_img, conf=self.models[1][1])[0]  # Use the second model
+            cropped_img = orig_img[y1:y2, x1:x2]
+            if cropped_img.size == 0:
+                batch[index].fill(114)
+            else:
+                letterbox(cropped_img, (size, size), dst=batch[index])
 
-            extract_result = self.extract_prediction_result(result)
-            return self.get_highest_confidence_target(extract_result, target_label)
+        try:
+            # 用二次模型对所有裁减图片一次批量预测
+            batch_result = self.run_model_batch(1, list(batch))  # Use the second model
+            return [self.get_highest_confidence_target(extract_result, target_label)
+                    for extract_result, (_, target_label) in zip(batch_result, candidates)]
 
         except Exception as e:
             Logger.log_error(f"预测发生错误: {str(e)}")
-            return 0
+            return [0] * len(candidates)
+
+    def verify_second_stage(self, orig_img, all_predictions, offset=(0, 0)):
+        """对第一次检测到候选框的目标批量进行二次模型检测, 并按 conf2 重新判定."""
+        indices = [index for index, prediction in enumerate(all_predictions) if prediction["predict_conf"] > 0]
+        if not indices:
+            return
+
+        candidates = [(all_predictions[index]["boxes"], all_predictions[index]["label"]) for index in indices]
+        for index, second_stage_conf_predict in zip(indices, self.crop_and_predict(orig_img, candidates, offset)):
+            target = self.targets[index]
+            prediction = all_predictions[index]
+            prediction["predict_conf"] = round(second_stage_conf_predict, 2)
+            prediction["target_conf"] = target["conf2"]
+            prediction["passed"] = bool(prediction["predict_conf"] >= target["conf2"])
+            prediction["color"] = target["color"] if prediction["passed"] else [0, 0, 255]
 
     def morphology_detect(self, orig_img, box, morphology, target_label):
         """按照第一次预测结果框裁剪图像，并进行形态学检测"""
@@ -205,41 +437,36 @@ class YoloModel:
         return diameter
 
     def get_highest_confidence_target(self, predictions, target_label):
-        """从 YOLO 预测结果中获取标签为 target_label 的置信度最大的目标"""
-        filtered_predictions = [
-            pred for pred in predictions if pred[0] == target_label
-        ]
+        """从二次模型预测结果中获取标签为 target_label 的目标的最大置信度"""
+        names = self.get_model(1)[0].names
+        confs = [conf for _, conf, cls in predictions if names[int(cls)] == target_label]
 
-        # 如果没有找到目标，则返回 None
-        if not filtered_predictions:
+        # 如果没有找到目标，则返回 0
+        if not confs:
             return 0
 
-        # 找出置信度最大的目标
-        highest_confidence_target = max(filtered_predictions, key=lambda x: x[1])
-
-        return highest_confidence_target[1]
+        return max(confs)
 
-    def draw_judge_results(self, orig_img, prediction_result, timestamp):
-        """画检测框及保存图片."""
-        result_ready = True
+    def render(self, orig_img, prediction_result, result_ready, timestamp, jpeg=None, frame_shape=None):
+        """在缩放后的副本上画检测框并提交后台保存, 返回标注图片; 在PLC输出判定结果之后调用.
 
-        for prediction in prediction_result:
-            box = prediction["boxes"].astype(int)  # Ensure box coordinates are integers
-            label = f"{prediction["label"]} {prediction["predict_conf"]:.2f}"
-            cv2.rectangle(orig_img, (box[0], box[1]), (box[2], box[3]), prediction["color"], 2)
-            cv2.putText(orig_img, label, (box[0], box[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, prediction["color"], 2)
-
-            result_ready &= (prediction["predict_conf"] >= prediction["target_conf"])
+        orig_img 可为缩小的预览图, 此时 frame_shape 为原图尺寸(预测结果坐标所在的尺寸).
+        storage=sidecar 且有相机原始JPEG时, 保存原始JPEG及标注文件, 不再重新编码标注图片.
+        """
+        process_img = annotation_renderer.render(orig_img, prediction_result, frame_shape)
 
         # 文件夹格式task_name/yyyy-mm-dd, 如3UG-64530-3AO/2025-01-01
         inference_settings = global_config.get_inference_settings()
         root_dir = os.path.join(str(inference_settings['result_dir']), str(self.task_name), time.strftime('%Y-%m-%d'))
-        os.makedirs(root_dir, exist_ok=True)  # Ensure results directory exists
 
         if timestamp is None:
             timestamp = time.strftime('%Y%m%d_%H%M%S')
         save_path = os.path.join(root_dir, f"{'OK' if result_ready else 'NG'}_{timestamp}.jpg")
-        resized_img = cv2.resize(orig_img, (1280, 720))
-        cv2.imwrite(save_path, resized_img)
-
-        return orig_img, result_ready
+        if inference_settings['storage'] == "sidecar" and jpeg is not None:
+            sidecar = encode_sidecar(os.path.basename(save_path), self.task_name, timestamp,
+                                     prediction_result, result_ready)
+            result_writer.submit_files([(save_path, jpeg), (os.path.splitext(save_path)[0] + ".json", sidecar)])
+        else:
+            result_writer.submit(save_path, process_img)  # 写盘在后台线程完成
+
+        return process_img
@@ -0,0 +1,35 @@
+from modules.model_registry import ModelRegistry
+
+
+class FakeModel:
+    def __init__(self, path):
+        self.path = path
+
+
+def weights(tmp_path, name, size_mb=1):
+    path = tmp_path / name
+    path.write_bytes(b"\0" * size_mb * 1024 * 1024)
+    return str(path)
+
+
+def test_touch_refreshes_recency(tmp_path):
+    registry = ModelRegistry(budget_mb=2)
+    a, b, c = (weights(tmp_path, name) for name in ("a.pt", "b.pt", "c.pt"))
+    model_a = registry.get(a, FakeModel, "fake")
+    registry.get(b, FakeModel, "fake")
+    registry.touch(registry.key(a, "fake"))  # a 仍在检测中使用, b 只是被加载过
+    registry.get(c, FakeModel, "fake")
+    assert registry.get(a, FakeModel, "fake") is model_a
+    assert registry.stats()["evictions"] == 1
+    assert registry.stats()["misses"] == 3
+
+
+def test_pinned_models_are_not_evicted(tmp_path):
+    registry = ModelRegistry(budget_mb=2)
+    a, b, c = (weights(tmp_path, name) for name in ("a.pt", "b.pt", "c.pt"))
+    model_a = registry.get(a, FakeModel, "fake")
+    registry.pin([registry.key(a, "fake")])
+    registry.get(b, FakeModel, "fake")
+    registry.get(c, FakeModel, "fake")  # 预加载下一任务, 最久未用的 a 仍被保留
+    assert registry.get(a, FakeModel, "fake") is model_a
+    assert registry.stats()["models"] == 2
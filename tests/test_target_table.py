@@ -0,0 +1,82 @@
+import json
+import os
+import numpy as np
+from modules.inference_backend import as_detections
+from modules.target_table import TargetTable
+
+SETTING_PATH = os.path.join(os.path.dirname(__file__), "..", "config", "setting.json")
+
+
+def load_targets():
+    with open(SETTING_PATH) as f:
+        return json.load(f)[0]["targets"]
+
+
+def process_target(prediction_result, target, names):
+    """原逐目标判定(向量化之前的 YoloModel.process_target), 作为对照."""
+    predefined_region = np.array(target["predefined_region"])
+    final_predictions = {
+        "label": target["label"],
+        "predict_conf": 0.00,
+        "boxes": predefined_region,
+        "color": [0, 0, 255],
+        "target_conf": target["conf1"]
+    }
+    filtered_boxes = []
+    for box, conf, cls in prediction_result:
+        if (names[int(cls)] == target["label"] and box[0] >= predefined_region[0] and box[1] >= predefined_region[1]
+                and box[2] <= predefined_region[2] and box[3] <= predefined_region[3]):
+            filtered_boxes.append((box, conf))
+    if filtered_boxes:
+        candidate_box = max(filtered_boxes, key=lambda x: x[1])
+        final_predictions["boxes"] = candidate_box[0]
+        final_predictions["predict_conf"] = round(candidate_box[1], 2)
+        if final_predictions["predict_conf"] >= final_predictions["target_conf"]:
+            final_predictions["color"] = target["color"]
+    return final_predictions
+
+
+def random_detections(rng, targets, names, count):
+    """在各目标区域内外随机生成检测框, 置信度包含同分及恰好等于阈值的情况."""
+    class_ids = {name: cls_id for cls_id, name in names.items()}
+    rows = []
+    for _ in range(count):
+        target = targets[rng.integers(len(targets))]
+        x1, y1, x2, y2 = target["predefined_region"]
+        margin = rng.integers(-5, 10, size=4)
+        box = [x1 + margin[0], y1 + margin[1], x2 - margin[2], y2 - margin[3]]
+        label = target["label"] if rng.random() < 0.8 else names[rng.integers(len(names))]
+        conf = rng.choice([target["conf1"], 0.695, 0.705, 0.5, 0.99, rng.random()])
+        rows.append(box + [conf, class_ids[label]])
+    if rows and rng.random() < 0.5:
+        rows.append(list(rows[0]))  # 完全相同的检测框, 同分时应取最先出现的
+    return as_detections(np.array(rows, dtype=np.float64).reshape(-1, 6))
+
+
+def test_match_equals_process_target():
+    targets = load_targets()
+    names = {cls_id: name for cls_id, name in enumerate(dict.fromkeys(t["label"] for t in targets))}
+    names[len(names)] = "OTHER"
+    table = TargetTable(targets)
+    lut = table.label_lut(names)
+    rng = np.random.default_rng(0)
+
+    for _ in range(200):
+        detections = random_detections(rng, targets, names, int(rng.integers(0, 120)))
+        predictions = table.match(detections, lut)
+        for target, prediction in zip(targets, predictions):
+            expected = process_target(detections, target, names)
+            assert prediction["predict_conf"] == expected["predict_conf"]
+            assert list(prediction["color"]) == list(expected["color"])
+            assert np.array_equal(np.asarray(prediction["boxes"]), np.asarray(expected["boxes"]))
+            assert prediction["passed"] == (expected["predict_conf"] >= expected["target_conf"])
+
+
+def test_match_at_threshold():
+    targets = load_targets()[:1]
+    names = {0: targets[0]["label"]}
+    table = TargetTable(targets)
+    detections = as_detections(np.array([targets[0]["predefined_region"] + [targets[0]["conf1"], 0]]))
+    prediction = table.match(detections, table.label_lut(names))[0]
+    assert prediction["passed"]
+    assert list(prediction["color"]) == targets[0]["color"]
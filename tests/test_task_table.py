@@ -0,0 +1,91 @@
+import json
+import pytest
+import modules.task_table as task_table
+from modules.task_table import TaskTable
+
+
+class FakeYoloModel:
+    """只记录是否预热的 YoloModel 替身, 不加载模型."""
+
+    def __init__(self, config_path, task_name=None, preload=True):
+        self.config_path = config_path
+        self.task_name = task_name
+        self.recipe = None
+        self.ready = preload
+
+    def reload_targets(self, preload=True):
+        return FakeYoloModel(self.config_path, self.task_name, preload)
+
+    def warmup(self):
+        self.ready = True
+
+
+def write_tasks(tmp_path, names):
+    path = tmp_path / "setting.json"
+    path.write_text(json.dumps([{"task_name": name} for name in names]))
+    return str(path)
+
+
+def test_reload_warms_active_task_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_table, "YoloModel", FakeYoloModel)
+    path = write_tasks(tmp_path, ["A", "B", "C"])
+    tasks = TaskTable(path, active="B")
+    assert [model.ready for model in tasks.tasks.values()] == [False, True, False]
+
+    write_tasks(tmp_path, ["A", "B", "C", "D"])
+    reloaded = tasks.reload_targets()
+    assert reloaded.active == "B"
+    assert [model.ready for model in reloaded.tasks.values()] == [False, True, False, False]
+
+
+def test_reload_without_preload_warms_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_table, "YoloModel", FakeYoloModel)
+    tasks = TaskTable(write_tasks(tmp_path, ["A", "B"]), active="B")
+    reloaded = tasks.reload_targets(preload=False)
+    assert not any(model.ready for model in reloaded.tasks.values())
+    assert reloaded._preloading is tasks._preloading
+
+
+class CameraTargetsModel(FakeYoloModel):
+    """带目标配置的替身, 按相机分配目标的逻辑与 YoloModel 相同."""
+
+    camera_targets = task_table.YoloModel.camera_targets
+
+    def __init__(self, targets):
+        super().__init__("", preload=False)
+        self.targets = targets
+
+
+class FakeCamera:
+    def __init__(self, name, task=""):
+        self.name = name
+        self.task = task
+
+
+def test_validate_cameras(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_table, "YoloModel", FakeYoloModel)
+    tasks = TaskTable(write_tasks(tmp_path, ["A"]))
+    cameras = [FakeCamera("left"), FakeCamera("right")]
+
+    # 标签重复的目标按各自的 camera 分配, 而不是按标签
+    tasks.tasks["A"] = CameraTargetsModel([{"label": "SPOT1", "camera": "left"}, {"label": "SPOT1", "camera": "right"},
+                                           {"label": "NUT", "camera": "left"}])
+    tasks.validate_cameras(cameras)
+    assert tasks.model.camera_targets("left") == [0, 2]
+    assert tasks.model.camera_targets("right") == [1]
+
+    # 未按相机分配目标的任务: 每台相机判定全部目标
+    tasks.tasks["A"] = CameraTargetsModel([{"label": "SPOT1"}])
+    tasks.validate_cameras(cameras)
+    assert tasks.model.camera_targets("left") is None
+
+    for targets in ([{"label": "SPOT1", "camera": "left"}, {"label": "SPOT1", "camera": "rigth"}],  # 相机名称错误
+                    [{"label": "SPOT1", "camera": "left"}, {"label": "SPOT1"}],  # 目标未分配相机
+                    [{"label": "SPOT1", "camera": "left"}]):  # 相机 right 没有目标
+        tasks.tasks["A"] = CameraTargetsModel(targets)
+        with pytest.raises(ValueError):
+            tasks.validate_cameras(cameras)
+
+    # 绑定其他任务的相机不参与该任务的判定
+    tasks.tasks["A"] = CameraTargetsModel([{"label": "SPOT1", "camera": "left"}])
+    tasks.validate_cameras([FakeCamera("left"), FakeCamera("right", task="B")])